@@ -1,7 +1,16 @@
 # ai_provider.py
 import os
+import re
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from dotenv import load_dotenv
 
+import metrics
+import image_tags
+
 load_dotenv()
 
 # Normalize provider selection (case-insensitive, accept common aliases)
@@ -11,30 +20,296 @@ if _raw_provider in ("gemini", "gemini-pro", "gemini-1.5-pro", "gemini-flash", "
 else:
     AI_PROVIDER = _raw_provider
 
+# Where image tags come from: "vision" (Google Vision, local tagger as fallback) or "local" (no network)
+IMAGE_TAGS_SOURCE = (os.getenv("IMAGE_TAGS_SOURCE", "vision") or "vision").strip().lower()
+# Multi-image posts: images tagged at once per post, and size of the merged tag set
+AI_TAG_CONCURRENCY = int(os.getenv("AI_TAG_CONCURRENCY", "4") or 4)
+AI_MAX_TAGS = int(os.getenv("AI_MAX_TAGS", "15") or 15)
+
 # ----------------------
 # Gemini (Google Generative AI)
 # ----------------------
-def call_gemini(prompt: str):
-    try:
-        import google.generativeai as genai
+# SDK imports and clients are built once and reused (see warm_up)
+_gemini_model = None
+_vision_client = None
+# One lock per client, so a slow Vision import does not hold up the first Gemini call
+_gemini_lock = threading.Lock()
+_vision_lock = threading.Lock()
+
+
+def _get_gemini_model():
+    global _gemini_model
+    with _gemini_lock:
+        if _gemini_model is None:
+            import google.generativeai as genai
+
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("Missing GEMINI_API_KEY in .env")
+
+            genai.configure(api_key=api_key)
+            _gemini_model = genai.GenerativeModel("gemini-1.5-flash")
+        return _gemini_model
+
+
+def _get_vision_client():
+    global _vision_client
+    with _vision_lock:
+        if _vision_client is None:
+            from google.cloud import vision
+            _vision_client = vision.ImageAnnotatorClient()
+        return _vision_client
+
+
+def warm_up():
+    """Import SDKs and build provider clients ahead of the first request.
+
+    Returns {name: {"status": "ok" | "error", "seconds": float, ...}}.
+    """
+    steps = [("local_tagger", image_tags.warm_up)]
+    if IMAGE_TAGS_SOURCE != "local":
+        steps.insert(0, ("vision", _get_vision_client))
+    if AI_PROVIDER == "gemini":
+        steps.insert(0, ("gemini", _get_gemini_model))
+    report = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+            report[name] = {"status": "ok"}
+        except Exception as e:
+            print(f"Warm-up of {name} failed:", e)
+            report[name] = {"status": "error", "error": str(e)}
+        report[name]["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+# ----------------------
+# Circuit breakers (one per remote provider)
+# ----------------------
+# Open when at least AI_BREAKER_FAILURE_RATE of the last AI_BREAKER_WINDOW calls failed
+# (calls slower than AI_BREAKER_SLOW_CALL seconds count as failures)
+AI_BREAKER_WINDOW = int(os.getenv("AI_BREAKER_WINDOW", "20") or 20)
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "5") or 5)
+AI_BREAKER_FAILURE_RATE = float(os.getenv("AI_BREAKER_FAILURE_RATE", "0.5") or 0.5)
+AI_BREAKER_SLOW_CALL = float(os.getenv("AI_BREAKER_SLOW_CALL", "30") or 30)
+# Seconds an open breaker fails fast before letting one trial call through
+AI_BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "30") or 30)
+# Hedged mode: use the local fallback if Gemini has not answered (or started streaming)
+# within this many seconds per story (a batch of n stories gets n times as long); the
+# remote call is left to finish in the background. 0 = off
+AI_HEDGE_AFTER = float(os.getenv("AI_HEDGE_AFTER", "0") or 0)
 
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("Missing GEMINI_API_KEY in .env")
 
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel("gemini-1.5-flash")
+class CircuitBreaker:
+    """Closed -> open on a high failure rate; open -> half-open after the cooldown, where a
+    single trial call decides between closing again and another cooldown.
+
+    allow() hands out a permit that the caller passes back to record(). Each state change
+    starts a new epoch, and results from calls admitted in an earlier epoch are ignored, so a
+    slow call from the closed period cannot decide a half-open trial it was not part of.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, window: int = AI_BREAKER_WINDOW, min_calls: int = AI_BREAKER_MIN_CALLS,
+                 failure_rate: float = AI_BREAKER_FAILURE_RATE, cooldown: float = AI_BREAKER_COOLDOWN):
+        self.name = name
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self._results = deque(maxlen=max(1, window))
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._epoch = 0
+        metrics.PROVIDER_BREAKER_STATE.set(0, provider=name)
+
+    def _set_state(self, state):
+        self._state = state
+        self._epoch += 1
+        metrics.PROVIDER_BREAKER_STATE.set(self._STATE_VALUES[state], provider=self.name)
+        print(f"Circuit breaker for {self.name} is now {state}")
+
+    def allow(self):
+        """A permit for one call (pass it to record()), or None to fail fast to the fallback."""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._set_state(self.HALF_OPEN)
+            if self._state == self.CLOSED:
+                return (self._epoch, False)
+            if self._state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return (self._epoch, True)
+        metrics.PROVIDER_REJECTED.inc(provider=self.name)
+        return None
+
+    def record(self, permit, ok: bool, seconds: float = 0.0):
+        ok = ok and seconds <= AI_BREAKER_SLOW_CALL
+        epoch, trial = permit
+        with self._lock:
+            if epoch != self._epoch:
+                return  # admitted before the last state change; says nothing about this one
+            if trial:
+                self._trial_running = False
+                self._results.clear()
+                if ok:
+                    self._set_state(self.CLOSED)
+                else:
+                    self._opened_at = time.monotonic()
+                    self._set_state(self.OPEN)
+                return
+            self._results.append(ok)
+            failures = self._results.count(False)
+            if (self._state == self.CLOSED and len(self._results) >= self.min_calls
+                    and failures / len(self._results) >= self.failure_rate):
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            calls = len(self._results)
+            return {
+                "state": self._state,
+                "recent_calls": calls,
+                "failure_rate": round(self._results.count(False) / calls, 3) if calls else 0.0,
+                "open_for": round(time.monotonic() - self._opened_at, 1) if self._state != self.CLOSED else 0.0,
+            }
+
+
+breakers = {"gemini": CircuitBreaker("gemini"), "vision": CircuitBreaker("vision")}
+
+
+def breaker_states():
+    return {name: b.snapshot() for name, b in breakers.items()}
+
+
+def call_gemini(prompt: str):
+    breaker = breakers["gemini"]
+    permit = breaker.allow()
+    if permit is None:
+        return None
+    started = time.perf_counter()
+    ok = False
+    try:
+        model = _get_gemini_model()
         response = model.generate_content(prompt)
+        ok = True
         return response.text
     except Exception as e:
         print("Gemini call failed:", e)
+        metrics.PROVIDER_ERRORS.inc(provider="gemini", operation="generate")
         return None
+    finally:
+        elapsed = time.perf_counter() - started
+        breaker.record(permit, ok, elapsed)
+        metrics.PROVIDER_REQUEST_DURATION.observe(elapsed, provider="gemini", operation="generate")
+
+
+class StreamInterrupted(Exception):
+    """A Gemini stream failed after some text was already yielded; that text is incomplete."""
+
+
+def call_gemini_stream(prompt: str):
+    """Yield text chunks as Gemini produces them.
+
+    Yields nothing if the call fails up front; raises StreamInterrupted if it fails midway.
+    """
+    breaker = breakers["gemini"]
+    permit = breaker.allow()
+    if permit is None:
+        return
+    started = time.perf_counter()
+    ok = False
+    yielded = False
+    try:
+        model = _get_gemini_model()
+        for chunk in model.generate_content(prompt, stream=True):
+            text = getattr(chunk, "text", "")
+            if text:
+                yielded = True
+                yield text
+        ok = True
+    except Exception as e:
+        print("Gemini stream failed:", e)
+        metrics.PROVIDER_ERRORS.inc(provider="gemini", operation="stream")
+        if yielded:
+            raise StreamInterrupted(str(e)) from e
+    finally:
+        elapsed = time.perf_counter() - started
+        breaker.record(permit, ok, elapsed)
+        metrics.PROVIDER_REQUEST_DURATION.observe(elapsed, provider="gemini", operation="stream")
+
+
+# ----------------------
+# Hedged calls
+# ----------------------
+_hedge_pool = None
+_hedge_lock = threading.Lock()
+
+
+def _get_hedge_pool():
+    global _hedge_pool
+    with _hedge_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=max(4, AI_BATCH_SIZE * 2), thread_name_prefix="ai-hedge")
+        return _hedge_pool
+
+
+def call_gemini_hedged(prompt: str, items: int = 1):
+    """call_gemini, but give up after AI_HEDGE_AFTER seconds so the caller falls back locally.
+
+    items: stories the prompt asks for; a batched prompt gets AI_HEDGE_AFTER per story.
+    """
+    if not AI_HEDGE_AFTER:
+        return call_gemini(prompt)
+    budget = AI_HEDGE_AFTER * max(1, items)
+    future = _get_hedge_pool().submit(call_gemini, prompt)
+    try:
+        return future.result(timeout=budget)
+    except FutureTimeout:
+        print(f"Gemini missed the {budget:g}s hedge budget, using local fallback")
+        metrics.PROVIDER_HEDGED.inc(provider="gemini")
+        return None
+
+
+def call_gemini_stream_hedged(prompt: str):
+    """call_gemini_stream, but yield nothing if the first chunk takes longer than AI_HEDGE_AFTER."""
+    if not AI_HEDGE_AFTER:
+        yield from call_gemini_stream(prompt)
+        return
+    chunks = queue.Queue()
+
+    def pump():
+        try:
+            for chunk in call_gemini_stream(prompt):
+                chunks.put(chunk)
+        except StreamInterrupted as e:
+            chunks.put(e)  # re-raised on the caller's side
+        finally:
+            chunks.put(None)
+
+    _get_hedge_pool().submit(pump)
+    try:
+        chunk = chunks.get(timeout=AI_HEDGE_AFTER)
+    except queue.Empty:
+        print(f"Gemini stream missed the {AI_HEDGE_AFTER:g}s hedge budget, using local fallback")
+        metrics.PROVIDER_HEDGED.inc(provider="gemini")
+        return
+    while chunk is not None:
+        if isinstance(chunk, StreamInterrupted):
+            raise chunk
+        yield chunk
+        chunk = chunks.get()
 
 
 # ----------------------
 # Lightweight local fallback (no external API)
 # ----------------------
 def _local_generate(idea_text: str, tags: list[str] | None = None):
+    metrics.LOCAL_FALLBACKS.inc()
     tags = tags or []
     idea = (idea_text or "").strip()
     tags_snippet = ", ".join(tags[:6]) if tags else "visual elements"
@@ -63,21 +338,82 @@ def _local_generate(idea_text: str, tags: list[str] | None = None):
 
 
 # ----------------------
-# Vision API helper (optional)
+# Image tags: Vision API (optional) with a local CPU tagger
 # ----------------------
 def extract_image_tags(image_path: str):
+    if IMAGE_TAGS_SOURCE == "local":
+        return local_image_tags(image_path)
+    tags = vision_image_tags(image_path)
+    if not tags:
+        print("Using local image tagger (no Vision labels)")
+        tags = local_image_tags(image_path)
+    return tags
+
+
+def extract_tags_for_images(image_paths):
+    """Tag several images of one post concurrently (at most AI_TAG_CONCURRENCY at a time)."""
+    image_paths = [p for p in image_paths if p]
+    if len(image_paths) <= 1:
+        return [extract_image_tags(p) for p in image_paths]
+    with ThreadPoolExecutor(max_workers=min(len(image_paths), max(1, AI_TAG_CONCURRENCY)),
+                            thread_name_prefix="image-tags") as pool:
+        return list(pool.map(extract_image_tags, image_paths))
+
+
+def merge_tags(tag_lists, limit: int = AI_MAX_TAGS):
+    """One tag set for several images: case-insensitive dedupe, ranked by weight.
+
+    A tag scores more the earlier it appears in an image's list (labels come best-first)
+    and for every image it appears in; the first (primary) image counts double.
+    """
+    scores = {}
+    names = {}
+    for image_idx, tags in enumerate(tag_lists):
+        image_weight = 2.0 if image_idx == 0 else 1.0
+        seen = set()
+        for rank, tag in enumerate(tags):
+            key = str(tag).strip().lower()
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            names.setdefault(key, str(tag).strip())
+            scores[key] = scores.get(key, 0.0) + image_weight * (1.0 - rank / (len(tags) + 1))
+    ranked = sorted(scores, key=lambda k: -scores[k])
+    return [names[k] for k in ranked[:limit]]
+
+
+def local_image_tags(image_path: str):
+    started = time.perf_counter()
+    tags = image_tags.extract_local_tags(image_path)
+    metrics.PROVIDER_REQUEST_DURATION.observe(time.perf_counter() - started, provider="local", operation="tags")
+    return tags
+
+
+def vision_image_tags(image_path: str):
+    breaker = breakers["vision"]
+    permit = breaker.allow()
+    if permit is None:
+        return []
+    started = time.perf_counter()
+    ok = False
     try:
         from google.cloud import vision
-        client = vision.ImageAnnotatorClient()
+        client = _get_vision_client()
         with open(image_path, "rb") as f:
             content = f.read()
         image = vision.Image(content=content)
         response = client.label_detection(image=image)
         labels = [label.description for label in response.label_annotations]
+        ok = True
         return labels
     except Exception as e:
         print("Vision API failed:", e)
+        metrics.PROVIDER_ERRORS.inc(provider="vision", operation="label_detection")
         return []
+    finally:
+        elapsed = time.perf_counter() - started
+        breaker.record(permit, ok, elapsed)
+        metrics.PROVIDER_REQUEST_DURATION.observe(elapsed, provider="vision", operation="label_detection")
 
 
 # ----------------------
@@ -106,6 +442,27 @@ Create three sections separated by "---":
 3. About the artist
 """
 
+def build_prompt_from_image_and_text(tags, idea_text):
+    # Combine tags and artisan prompt into one richer prompt
+    return f"""
+You are an AI helping artisans tell stories about their artwork.
+
+Detected elements in the image: {", ".join(tags)}.
+Artisan prompt: "{idea_text}"
+
+Write three sections separated by "---":
+1. Story behind the art that uses both the visual tags and the artisan's prompt
+2. Purpose of the art
+3. About the artist
+"""
+
+def _split_sections(out: str):
+    parts = out.split('---')
+    story = parts[0].strip() if len(parts) > 0 else out
+    purpose = parts[1].strip() if len(parts) > 1 else ""
+    artist = parts[2].strip() if len(parts) > 2 else ""
+    return story, purpose, artist
+
 
 # ----------------------
 # Public functions
@@ -113,13 +470,10 @@ Create three sections separated by "---":
 def generate_from_image(image_path: str):
     tags = extract_image_tags(image_path)
     prompt = build_prompt_from_tags(tags)
-    out = call_gemini(prompt) if AI_PROVIDER == "gemini" else None
+    out = call_gemini_hedged(prompt) if AI_PROVIDER == "gemini" else None
 
     if out:
-        parts = out.split('---')
-        story = parts[0].strip() if len(parts) > 0 else out
-        purpose = parts[1].strip() if len(parts) > 1 else ""
-        artist = parts[2].strip() if len(parts) > 2 else ""
+        story, purpose, artist = _split_sections(out)
     else:
         print("Using local fallback generation (image)")
         story, purpose, artist = _local_generate("", tags)
@@ -128,13 +482,10 @@ def generate_from_image(image_path: str):
 
 def generate_from_text(idea_text: str):
     prompt = build_prompt_from_text(idea_text)
-    out = call_gemini(prompt) if AI_PROVIDER == "gemini" else None
+    out = call_gemini_hedged(prompt) if AI_PROVIDER == "gemini" else None
 
     if out:
-        parts = out.split('---')
-        story = parts[0].strip() if len(parts) > 0 else out
-        purpose = parts[1].strip() if len(parts) > 1 else ""
-        artist = parts[2].strip() if len(parts) > 2 else ""
+        story, purpose, artist = _split_sections(out)
     else:
         print("Using local fallback generation (text)")
         story, purpose, artist = _local_generate(idea_text, [])
@@ -143,26 +494,184 @@ def generate_from_text(idea_text: str):
 
 def generate_from_image_and_text(image_path: str, idea_text: str):
     tags = extract_image_tags(image_path)
-    # Combine tags and artisan prompt into one richer prompt
-    prompt = f"""
-You are an AI helping artisans tell stories about their artwork.
+    prompt = build_prompt_from_image_and_text(tags, idea_text)
+    out = call_gemini_hedged(prompt) if AI_PROVIDER == "gemini" else None
 
-Detected elements in the image: {", ".join(tags)}.
-Artisan prompt: "{idea_text}"
+    if out:
+        story, purpose, artist = _split_sections(out)
+    else:
+        print("Using local fallback generation (image+text)")
+        story, purpose, artist = _local_generate(idea_text, tags)
+    return story, purpose, artist
 
-Write three sections separated by "---":
-1. Story behind the art that uses both the visual tags and the artisan's prompt
-2. Purpose of the art
-3. About the artist
+
+# ----------------------
+# Batched generation (several posts per Gemini request)
+# ----------------------
+AI_BATCH_SIZE = int(os.getenv("AI_BATCH_SIZE", "8") or 8)
+AI_BATCH_MAX_WAIT = float(os.getenv("AI_BATCH_MAX_WAIT", "0.5") or 0.5)
+# Batches sent to Gemini at the same time per process; the collector keeps forming new
+# batches while these are in flight
+AI_BATCH_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "4") or 4)
+
+_ITEM_RE = re.compile(r"<<<ITEM\s+(\d+)>>>(.*?)<<<END\s+\1>>>", re.S)
+
+
+def build_batch_prompt(prompts):
+    items = "\n\n".join(
+        f"<<<ITEM {i}>>>\n{p.strip()}\n<<<END {i}>>>" for i, p in enumerate(prompts, 1)
+    )
+    return f"""
+You are an AI helping artisans tell stories about their artwork.
+Below are {len(prompts)} independent requests, each wrapped in <<<ITEM n>>> and <<<END n>>> markers.
+Answer every request on its own and wrap each answer in the same markers:
+<<<ITEM n>>>
+(answer, with its sections separated by "---")
+<<<END n>>>
+Keep the numbering of the requests. Do not merge, reorder or skip items.
+
+{items}
 """
-    out = call_gemini(prompt) if AI_PROVIDER == "gemini" else None
+
+
+def parse_batch_output(out: str, count: int):
+    """Map item index (0-based) -> answer text. Missing or malformed items are left out."""
+    results = {}
+    for m in _ITEM_RE.finditer(out or ""):
+        idx = int(m.group(1)) - 1
+        body = m.group(2).strip()
+        if 0 <= idx < count and body and idx not in results:
+            results[idx] = body
+    return results
+
+
+def generate_batch(jobs):
+    """jobs: list of (prompt, idea_text, tags). Returns one (story, purpose, artist) per job."""
+    if not jobs:
+        return []
+    results = [None] * len(jobs)
+    if AI_PROVIDER == "gemini":
+        if len(jobs) == 1:
+            out = call_gemini_hedged(jobs[0][0])
+            if out:
+                results[0] = _split_sections(out)
+        else:
+            out = call_gemini_hedged(build_batch_prompt([job[0] for job in jobs]), items=len(jobs))
+            for idx, body in parse_batch_output(out, len(jobs)).items():
+                results[idx] = _split_sections(body)
+    for idx, (_, idea_text, tags) in enumerate(jobs):
+        if results[idx] is None:
+            print(f"Using local fallback generation (batch item {idx + 1}/{len(jobs)})")
+            results[idx] = _local_generate(idea_text, tags)
+    return results
+
+
+class StoryBatcher:
+    """Collects pending prompts and sends them to Gemini in groups.
+
+    A batch is flushed once it holds ``batch_size`` prompts or ``max_wait``
+    seconds after its first prompt arrived, whichever comes first. Flushed batches run on a
+    pool of ``concurrency`` threads, so up to that many Gemini requests are in flight at once.
+    """
+
+    def __init__(self, batch_size: int = AI_BATCH_SIZE, max_wait: float = AI_BATCH_MAX_WAIT,
+                 concurrency: int = AI_BATCH_CONCURRENCY):
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(concurrency)), thread_name_prefix="story-batch")
+
+    def submit(self, prompt: str, idea_text: str = "", tags: list[str] | None = None) -> Future:
+        fut = Future()
+        self._queue.put((prompt, idea_text, tags or [], fut))
+        self._ensure_worker()
+        return fut
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="story-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(pending) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._flush, pending)
+
+    def _flush(self, pending):
+        jobs = [(prompt, idea_text, tags) for prompt, idea_text, tags, _ in pending]
+        try:
+            results = generate_batch(jobs)
+        except Exception as e:
+            print("Batch generation failed:", e)
+            results = [_local_generate(idea_text, tags) for _, idea_text, tags in jobs]
+        for (_, _, _, fut), result in zip(pending, results):
+            fut.set_result(result)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher() -> StoryBatcher:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = StoryBatcher()
+        return _batcher
+
+
+def _build_story_prompt(images, idea_text: str):
+    """images: one image path or a list of them (all images of the post, primary first)."""
+    image_paths = [images] if isinstance(images, str) else [p for p in (images or []) if p]
+    tags = merge_tags(extract_tags_for_images(image_paths)) if image_paths else []
+    if image_paths and idea_text:
+        prompt = build_prompt_from_image_and_text(tags, idea_text)
+    elif image_paths:
+        prompt = build_prompt_from_tags(tags)
+    else:
+        prompt = build_prompt_from_text(idea_text)
+    return prompt, tags
+
+
+def generate_batched(images, idea_text: str = ""):
+    """Same result as the generate_from_* helpers, but shares Gemini requests with concurrent posts."""
+    prompt, tags = _build_story_prompt(images, idea_text)
+    return get_batcher().submit(prompt, idea_text, tags).result()
+
+
+# ----------------------
+# Streamed generation (story visible while it is being written)
+# ----------------------
+def generate_streamed(images, idea_text: str = "", on_story=None):
+    """Like generate_batched, but calls on_story(text_so_far) as the story section arrives."""
+    prompt, tags = _build_story_prompt(images, idea_text)
+    out = ""
+    if AI_PROVIDER == "gemini":
+        try:
+            for chunk in call_gemini_stream_hedged(prompt):
+                out += chunk
+                if on_story:
+                    on_story(out.split('---', 1)[0].strip())
+        except StreamInterrupted:
+            out = ""  # a cut-off answer is not a story; on_story below replaces what was shown
 
     if out:
-        parts = out.split('---')
-        story = parts[0].strip() if len(parts) > 0 else out
-        purpose = parts[1].strip() if len(parts) > 1 else ""
-        artist = parts[2].strip() if len(parts) > 2 else ""
+        story, purpose, artist = _split_sections(out)
     else:
-        print("Using local fallback generation (image+text)")
+        print("Using local fallback generation (stream)")
         story, purpose, artist = _local_generate(idea_text, tags)
+        if on_story:
+            on_story(story)
     return story, purpose, artist
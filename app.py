@@ -2,35 +2,246 @@
 import os
 from typing import List
 import sqlite3
-import uuid
+import time
 import datetime
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, UploadFile, File, Form, BackgroundTasks
-from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse, StreamingResponse, PlainTextResponse, Response
+from starlette.routing import Match
+from starlette.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from dotenv import load_dotenv
 import ai_provider  # <-- will handle Gemini
+import metrics
+import trending
+import timelines
+import uploads
+import similarity
+import page_cache
+import cache_sync
+import retention
+import artist_stats
+import db
+from db import get_conn
 from passlib.context import CryptContext
 import httpx
 import json
+from markupsafe import Markup
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
 
 load_dotenv()
 
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "static", "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(uploads.UPLOAD_DIR, exist_ok=True)
+
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "artfeed.db")
+# Story generation mode for new posts:
+#   0 (default) - queue the story on ai_provider's StoryBatcher, which folds concurrent posts
+#                 into one Gemini call; cheapest under load, but the story appears all at once
+#   1           - one streamed Gemini call per post, shown on the post page as it is written;
+#                 lower time-to-first-word, at the cost of one remote call per post
+AI_STREAM_STORIES = os.getenv("AI_STREAM_STORIES", "0") == "1"
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-app = FastAPI()
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# ----------------------------
+# Startup (schema checks, provider warm-up)
+# ----------------------------
+startup_state = {"ready": False, "timings": {}, "warmup": {}}
+
+def _warm_up_providers():
+    started = time.perf_counter()
+    try:
+        startup_state["warmup"] = ai_provider.warm_up()
+    finally:
+        startup_state["timings"]["provider_warmup"] = round(time.perf_counter() - started, 3)
+        # Ready once warm-up has finished, even if a provider failed (the local fallbacks serve)
+        startup_state["ready"] = True
+
+# Only one worker backfills missing image features per interval (claimed in maintenance_state)
+SIMILARITY_BACKFILL_INTERVAL = float(os.getenv("SIMILARITY_BACKFILL_INTERVAL", "3600") or 3600)
+
+def _load_similarity_index():
+    started = time.perf_counter()
+    try:
+        similarity.load_index()
+        if retention.claim("similarity_backfill", SIMILARITY_BACKFILL_INTERVAL):
+            similarity.backfill(uploads.url_to_path)
+    except Exception as e:
+        print("Similarity index load failed:", e)
+    startup_state["timings"]["similarity_index"] = round(time.perf_counter() - started, 3)
+
+@asynccontextmanager
+async def lifespan(app):
+    started = time.perf_counter()
+    init_db()
+    ensure_schema()
+    startup_state["timings"]["schema"] = round(time.perf_counter() - started, 3)
+    trending.ensure_scores()
+    timelines.ensure_timelines()
+    artist_stats.ensure_stats()
+    trending.start_decay_thread()
+    retention.start_maintenance_thread()
+    metrics.start_multiprocess_writer()
+    # Other workers' writes: drop cached pages, pick up new image features
+    cache_sync.on_event("features", similarity.load_post)
+    cache_sync.start()
+    # Warm-up runs in the background so startup is not blocked; /ready answers 503 until it is done
+    startup_state["warmup"] = {"status": "running"}
+    threading.Thread(target=_warm_up_providers, name="provider-warmup", daemon=True).start()
+    threading.Thread(target=_load_similarity_index, name="similarity-index", daemon=True).start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")  # your folder name
+
+# ----------------------------
+# Metrics
+# ----------------------------
+def _route_template(request: Request) -> str:
+    # Label by route pattern ("/post/{post_id}"), not raw path, to keep label cardinality bounded
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+async def _after_body(body_iterator, on_done):
+    """Re-yield a response body, then call on_done() once it has been sent (or abandoned)."""
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        on_done()
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    route = _route_template(request)
+    method = request.method
+    metrics.HTTP_REQUESTS_IN_FLIGHT.inc(method=method, route=route)
+    started = time.perf_counter()
+    status = 500
+
+    def finished():
+        metrics.HTTP_REQUESTS_IN_FLIGHT.dec(method=method, route=route)
+        metrics.HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method=method, route=route, status=status)
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        finished()
+        raise
+    status = response.status_code
+    # call_next returns once the headers are ready; streamed bodies (feed shell, SSE, ?stream=1)
+    # are still being produced, so the request only counts as done after the last chunk
+    response.body_iterator = _after_body(response.body_iterator, finished)
+    return response
+
+@app.middleware("http")
+async def sql_trace_middleware(request: Request, call_next):
+    if not db.SQL_TRACE:
+        return await call_next(request)
+    token = db.start_request_trace()
+    try:
+        response = await call_next(request)
+    finally:
+        # The returned list keeps collecting queries run while a streamed body is produced
+        trace = db.end_request_trace(token)
+    total_ms = sum(elapsed for _, elapsed in trace) * 1000
+    response.headers["X-DB-Query-Count"] = str(len(trace))
+    response.headers["X-DB-Query-Time-Ms"] = f"{total_ms:.2f}"
+    if "content-length" not in response.headers:
+        # Streamed body: the headers only cover the queries run before the first chunk
+        response.headers["X-DB-Query-Trace-Partial"] = "1"
+
+    def check_budget():
+        if len(trace) > db.SQL_QUERY_BUDGET:
+            print(f"Query budget exceeded on {request.method} {request.url.path}: {len(trace)} queries (budget {db.SQL_QUERY_BUDGET})")
+            for sql, elapsed in trace:
+                print(f"    {elapsed * 1000:.2f} ms  {sql}")
+
+    response.body_iterator = _after_body(response.body_iterator, check_budget)
+    return response
+
+@app.get("/ready")
+def ready():
+    status_code = 200 if startup_state["ready"] else 503
+    # Circuit breaker state per AI provider ("open" = failing fast to the local fallback)
+    return JSONResponse({**startup_state, "providers": ai_provider.breaker_states()}, status_code=status_code)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+# ----------------------------
+# Fast JSON responses
+# ----------------------------
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# Post card built by SQLite's json_object, so list endpoints never materialize per-row dicts
+# The one "?" binds the viewer's username ("" when logged out), so it must be the first
+# parameter of every query using it; the likes(user, post_id) unique index answers it per row
+POST_CARD_JSON = """json_object(
+    'id', p.id, 'image', p.image_path, 'title', p.title, 'artist', p.artist,
+    'price', p.price, 'category', p.category, 'created_at', p.created_at,
+    'like_count', (SELECT COUNT(*) FROM likes l2 WHERE l2.post_id = p.id),
+    'liked_by_me', json(CASE WHEN EXISTS(
+        SELECT 1 FROM likes lm WHERE lm.user = ? AND lm.post_id = p.id
+    ) THEN 'true' ELSE 'false' END)
+)"""
+
+JSON_STREAM_BATCH = 256
+
+async def _iter_json_rows(query, params, conn=None):
+    # One dedicated connection; every cursor call goes through the threadpool one at a time, so
+    # the connection is never used concurrently even though successive batches may land on
+    # different worker threads.
+    conn = conn or get_conn(check_same_thread=False)
+    try:
+        c = await run_in_threadpool(conn.execute, query, params)
+        yield "["
+        first = True
+        while True:
+            rows = await run_in_threadpool(c.fetchmany, JSON_STREAM_BATCH)
+            if not rows:
+                break
+            chunk = ",".join(r[0] for r in rows)
+            yield chunk if first else "," + chunk
+            first = False
+        yield "]"
+    finally:
+        conn.close()
+
+def json_rows_response(query, params, stream=False, conn=None):
+    """Respond with a JSON array whose elements are the (already JSON) first column of each row.
+
+    stream=True writes rows from the cursor as they are read, keeping memory flat for big results.
+    conn: an open connection to run the query on (opened with check_same_thread=False when
+    streaming); it is closed once the response is built.
+    """
+    if stream:
+        return StreamingResponse(_iter_json_rows(query, params, conn), media_type="application/json")
+    conn = conn or get_conn()
+    c = conn.cursor()
+    c.execute(query, params)
+    body = "[" + ",".join(r[0] for r in c.fetchall()) + "]"
+    conn.close()
+    return Response(body, media_type="application/json")
+
 # ----------------------------
 # Schema helpers
 # ----------------------------
 def users_has_column(column_name: str) -> bool:
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute("PRAGMA table_info(users)")
     cols = [r[1] for r in c.fetchall()]
@@ -42,7 +253,7 @@ def users_has_column(column_name: str) -> bool:
 # Initialize DB
 # ----------------------------
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     
     # Posts table
@@ -61,6 +272,8 @@ def init_db():
         created_at TIMESTAMP
     )
     """)
+    # Newest-first feed pages (keyset pagination on created_at, id)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts(created_at)")
     
     # Users table
     c.execute("""
@@ -114,16 +327,27 @@ def init_db():
         )
         """
     )
+    # Trending scores (materialized, see trending.py)
+    trending.ensure_tables(c)
+    # Following timelines (fan-out on write, see timelines.py)
+    timelines.ensure_tables(c)
+    # Visual features for "more like this" (see similarity.py)
+    similarity.ensure_tables(c)
+    # Cross-worker cache invalidation events (see cache_sync.py)
+    cache_sync.ensure_tables(c)
+    # Message indexes and maintenance bookkeeping (see retention.py)
+    retention.ensure_tables(c)
+    # Per-artist counters (see artist_stats.py)
+    artist_stats.ensure_tables(c)
     
     conn.commit()
     conn.close()
 
-init_db()
 # ----------------------------
 # Manual migration helper
 # ----------------------------
 def ensure_schema():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     # Create posts table if missing
     c.execute(
@@ -143,6 +367,8 @@ def ensure_schema():
         )
         """
     )
+    # Create feed pagination index if missing
+    c.execute("CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts(created_at)")
     # Create users table if missing
     c.execute(
         """
@@ -212,6 +438,18 @@ def ensure_schema():
         )
         """
     )
+    # Create trending score tables if missing
+    trending.ensure_tables(c)
+    # Create following timelines if missing
+    timelines.ensure_tables(c)
+    # Create image feature table if missing
+    similarity.ensure_tables(c)
+    # Create cache invalidation event table if missing
+    cache_sync.ensure_tables(c)
+    # Create message indexes and maintenance table if missing
+    retention.ensure_tables(c)
+    # Create artist counters table if missing
+    artist_stats.ensure_tables(c)
     conn.commit()
     conn.close()
 
@@ -219,7 +457,7 @@ def ensure_schema():
 def admin_migrate():
     ensure_schema()
     # Backfill columns for already-created users table without columns
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     if not users_has_column("phone"):
         try:
@@ -236,28 +474,118 @@ def admin_migrate():
     conn.close()
     return JSONResponse({"status": "ok", "message": "Schema ensured (users.phone/users.bio present)"})
 
+@app.get("/admin/timelines/rebuild")
+def admin_timelines_rebuild():
+    timelines.rebuild()
+    return JSONResponse({"status": "ok", "message": "Following timelines rebuilt"})
+
+@app.get("/admin/trending/rebuild")
+def admin_trending_rebuild():
+    trending.rebuild()
+    return JSONResponse({"status": "ok", "message": "Trending scores rebuilt"})
+
+@app.get("/admin/artist_stats/rebuild")
+def admin_artist_stats_rebuild():
+    artist_stats.rebuild()
+    return JSONResponse({"status": "ok", "message": "Artist stats rebuilt"})
+
+@app.get("/admin/similarity/backfill")
+def admin_similarity_backfill():
+    indexed = similarity.backfill(uploads.url_to_path)
+    return JSONResponse({"status": "ok", "message": f"Indexed {indexed} posts"})
+
+@app.get("/admin/maintenance")
+def admin_maintenance():
+    return JSONResponse({"status": "ok", **retention.run_maintenance()})
+
+@app.get("/admin/maintenance/vacuum")
+def admin_maintenance_vacuum():
+    return JSONResponse({"status": "ok", **retention.enable_incremental_vacuum()})
+
 # ----------------------------
 # Helper to insert post
 # ----------------------------
-def insert_post(image_path, title, idea_text, story, purpose, artist, price, contact, category, images=None):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
+def _insert_post_row(c, image_path, title, idea_text, story, purpose, artist, price, contact, category, images=None):
     # Convert images list to JSON string
     images_json = None
     if images:
-        import json
         images_json = json.dumps(images)
     
+    created_at = datetime.datetime.utcnow()
     c.execute(
         "INSERT INTO posts (image_path, title, idea_text, story, purpose, artist, price, contact, category, images, created_at) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
-        (image_path, title, idea_text, story, purpose, artist, price, contact, category, images_json, datetime.datetime.utcnow()),
+        (image_path, title, idea_text, story, purpose, artist, price, contact, category, images_json, created_at),
     )
-    conn.commit()
     post_id = c.lastrowid
+    trending.on_new_post(c, post_id, created_at)
+    timelines.on_new_post(c, post_id, artist)
+    artist_stats.on_new_post(c, artist)
+    return post_id
+
+def insert_post(image_path, title, idea_text, story, purpose, artist, price, contact, category, images=None):
+    conn = get_conn()
+    c = conn.cursor()
+    post_id = _insert_post_row(c, image_path, title, idea_text, story, purpose, artist, price, contact, category, images)
+    conn.commit()
     conn.close()
+    cache_sync.invalidate(("post", post_id), ("artist", artist or ""))
     return post_id
 
+def insert_posts(rows, on_inserted=None):
+    """Insert many posts in a single transaction.
+
+    rows: dicts with insert_post's keyword arguments. on_inserted(cursor, post_id, row) runs
+    inside the same transaction (e.g. to record import progress). Returns the new post ids.
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    post_ids = []
+    try:
+        for row in rows:
+            post_id = _insert_post_row(c, **row)
+            if on_inserted:
+                on_inserted(c, post_id, row)
+            post_ids.append(post_id)
+        conn.commit()
+    finally:
+        conn.close()
+    events = [("post", post_id) for post_id in post_ids]
+    events += [("artist", artist) for artist in {row.get("artist") or "" for row in rows}]
+    cache_sync.invalidate(*events)
+    return post_ids
+
+def update_post_story(post_id, story, purpose, artist):
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("UPDATE posts SET story=?, purpose=?, artist=? WHERE id=?", (story, purpose, artist, post_id))
+    conn.commit()
+    conn.close()
+    cache_sync.invalidate(("post", post_id), ("artist", artist or ""))
+
+# ----------------------------
+# In-progress story buffers (filled while a story is streamed)
+# ----------------------------
+class StoryStream:
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self._lock = threading.Lock()
+
+    def update(self, text):
+        with self._lock:
+            self.text = text
+
+    def finish(self, text):
+        with self._lock:
+            self.text = text
+            self.done = True
+
+    def snapshot(self):
+        with self._lock:
+            return self.text, self.done
+
+story_streams = {}
+
 # ----------------------------
 # Follow helpers
 # ----------------------------
@@ -266,35 +594,61 @@ def follow_artist(follower: str, artist: str) -> bool:
     artist = (artist or "").strip()
     if not follower or not artist or follower.lower() == artist.lower():
         return False
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     try:
         c.execute("INSERT OR IGNORE INTO follows (follower, artist) VALUES (?, ?)", (follower.lower(), artist.lower()))
+        changed = c.rowcount
+        if changed:
+            # Stats first: timelines reads the follower count from artist_stats
+            artist_stats.on_follow(c, follower.lower(), artist.lower())
+            timelines.on_follow(c, follower.lower(), artist.lower())
         conn.commit()
+        if changed:
+            # Both profile pages cache their follower/following counts
+            cache_sync.invalidate(("artist", artist), ("artist", follower))
         return True
     finally:
         conn.close()
 
 def unfollow_artist(follower: str, artist: str) -> bool:
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute("DELETE FROM follows WHERE follower=? AND artist=?", (follower.lower(), artist.lower()))
+    changed = c.rowcount
+    if changed:
+        artist_stats.on_unfollow(c, follower.lower(), artist.lower())
+        timelines.on_unfollow(c, follower.lower(), artist.lower())
     conn.commit()
     conn.close()
+    if changed:
+        cache_sync.invalidate(("artist", artist), ("artist", follower))
     return True
 
-def is_following(follower: str, artist: str) -> bool:
-    conn = sqlite3.connect(DB_PATH)
+def is_following(follower: str, artist: str, conn=None) -> bool:
+    own = conn is None
+    conn = conn or get_conn()
     c = conn.cursor()
     c.execute("SELECT 1 FROM follows WHERE follower=? AND artist=?", (follower.lower(), artist.lower()))
     row = c.fetchone()
-    conn.close()
+    if own:
+        conn.close()
     return bool(row)
 
+def viewer_state(user, artist, post_ids):
+    """(following artist, liked subset of post_ids) for a logged-in viewer, on one connection."""
+    if not user:
+        return False, set()
+    conn = get_conn()
+    try:
+        return is_following(user, artist or "", conn), liked_post_ids(user, post_ids, conn)
+    finally:
+        conn.close()
+
 def is_mutual_follow(user_a: str, user_b: str) -> bool:
     if not user_a or not user_b:
         return False
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute(
         """
@@ -316,10 +670,32 @@ def is_mutual_follow(user_a: str, user_b: str) -> bool:
 # ----------------------------
 # Feed & Create Pages
 # ----------------------------
+# Marker a streamed template emits where everything rendered so far should go out
+_FLUSH = Markup("<!-- flush -->")
+
+def _stream_template(name, context):
+    """Render a template incrementally, sending output to the client at each {{ flush }}."""
+    buffer = []
+    for piece in templates.get_template(name).generate({**context, "flush": _FLUSH}):
+        if piece == _FLUSH:
+            yield "".join(buffer)
+            buffer = []
+        else:
+            buffer.append(piece)
+    yield "".join(buffer)
+
 @app.get("/", response_class=HTMLResponse)
 def feed(request: Request):
     user = request.cookies.get("user")
-    return templates.TemplateResponse("feed.html", {"request": request, "user": user})
+
+    def first_page():
+        # Runs while the template renders, i.e. after the page shell has been sent
+        posts = load_feed_page(user)
+        next_cursor = posts[-1]["id"] if len(posts) == FEED_PAGE_SIZE else None
+        return {"posts": posts, "next_cursor": next_cursor, "page_size": FEED_PAGE_SIZE}
+
+    context = {"request": request, "user": user, "first_page": first_page}
+    return StreamingResponse(_stream_template("feed.html", context), media_type="text/html; charset=utf-8")
 
 @app.get("/create", response_class=HTMLResponse)
 def create_page(request: Request):
@@ -333,12 +709,21 @@ def generate_art_page(request: Request):
     user = request.cookies.get("user")
     return templates.TemplateResponse("generate_art.html", {"request": request, "user": user})
 
+# ----------------------------
+# Uploaded images (ETag, immutable caching, byte ranges)
+# ----------------------------
+@app.get("/uploads/{rel_path:path}")
+@app.get("/static/uploads/{rel_path:path}")  # legacy post URLs; must be registered before the mount
+def serve_upload(request: Request, rel_path: str):
+    return uploads.serve_upload(request, rel_path)
+
+app.mount("/static", StaticFiles(directory="static"), name="static")
+
 # ----------------------------
 # Post detail page
 # ----------------------------
-@app.get("/post/{post_id}", response_class=HTMLResponse)
-def post_detail(request: Request, post_id: int):
-    conn = sqlite3.connect(DB_PATH)
+def load_post_detail(post_id: int):
+    conn = get_conn()
     c = conn.cursor()
     # Join posts and users tables to get user email along with post data
     c.execute("""
@@ -351,7 +736,7 @@ def post_detail(request: Request, post_id: int):
     row = c.fetchone()
     conn.close()
     if not row:
-        return HTMLResponse("Post not found", status_code=404)
+        return None
     
     # Parse images (JSON array or fallback to single image)
     images = []
@@ -379,15 +764,70 @@ def post_detail(request: Request, post_id: int):
         "email": row[10],  # Add email from the joined users table
         "like_count": row[11] or 0,
     }
+    return post
+
+def _render_fragment(name, **context):
+    return templates.get_template(f"fragments/{name}.html").render(**context)
+
+def cached_post_page(post_id: int):
+    """Post data plus its rendered user-independent fragments, cached per post/artist version."""
+    key = ("post_detail", post_id)
+    entry = page_cache.get(key)
+    if entry is not None:
+        return entry
+    versions = page_cache.snapshot([("post", post_id)])
+    post = load_post_detail(post_id)
+    if post is None:
+        return None
+    # From the row alone: streamed posts are inserted with an empty story, and the in-process
+    # stream entry can outlive the story write (and the version bump) by a moment
+    story_pending = not post["story"]
+    entry = {
+        "post": post,
+        "story_pending": story_pending,
+        "fragments": {
+            "media": _render_fragment("post_detail_media", post=post),
+            "meta": _render_fragment("post_detail_meta", post=post),
+            "body": _render_fragment("post_detail_body", post=post, story_pending=story_pending),
+        },
+    }
+    # The email comes from the artist's profile, so profile edits invalidate too
+    page_cache.put(key, entry, [("post", post_id), ("artist", post["artist"] or "")], versions)
+    return entry
+
+@app.get("/post/{post_id}", response_class=HTMLResponse)
+def post_detail(request: Request, post_id: int):
+    entry = cached_post_page(post_id)
+    if entry is None:
+        return HTMLResponse("Post not found", status_code=404)
+    post = entry["post"]
     user = request.cookies.get("user")
-    following = is_following(user, post['artist']) if user else False
-    
+    following, liked = viewer_state(user, post['artist'], [post_id])
+    liked_by_me = post_id in liked
+
     return templates.TemplateResponse(
         "post_detail.html",
-        {"request": request, "user": user, "post": post, "following": following}
+        {"request": request, "user": user, "post": post, "following": following, "liked_by_me": liked_by_me,
+         "story_pending": entry["story_pending"], "fragments": entry["fragments"]}
     )
 
 
+@app.get("/api/post/{post_id}/related")
+def related_posts(request: Request, post_id: int, k: int = 6):
+    ids = similarity.related(post_id, k=max(1, min(k, 24)))
+    if not ids:
+        return FastJSONResponse([])
+    # Keep nearest-first order from the index
+    values = ",".join(["(?, ?)"] * len(ids))
+    params = [request.cookies.get("user") or ""] + [v for rank, pid in enumerate(ids) for v in (pid, rank)]
+    query = f"""
+        SELECT {POST_CARD_JSON}
+        FROM (VALUES {values}) r
+        JOIN posts p ON p.id = r.column1
+        ORDER BY r.column2
+        """
+    return json_rows_response(query, params)
+
 # ----------------------------
 # Follow endpoints & Artist profile
 # ----------------------------
@@ -407,14 +847,18 @@ def api_unfollow(request: Request, artist: str = Form(...)):
     ok = unfollow_artist(user, artist)
     return JSONResponse({"status": "ok", "following": not ok})
 
-@app.get("/artist/{artist_name}", response_class=HTMLResponse)
-def artist_profile(request: Request, artist_name: str):
-    conn = sqlite3.connect(DB_PATH)
+def cached_artist_page(artist_name: str, show_like: bool):
+    """Artist bio plus the rendered post grid, cached per artist version."""
+    key = ("artist_page", artist_name, show_like)
+    entry = page_cache.get(key)
+    if entry is not None:
+        return entry
+    versions = page_cache.snapshot([("artist", artist_name)])
+    conn = get_conn()
     c = conn.cursor()
     c.execute(
         """
-        SELECT id, image_path, title, artist, price, created_at,
-               (SELECT COUNT(*) FROM likes l WHERE l.post_id = posts.id) AS like_count
+        SELECT id, image_path, title, artist, price, created_at
         FROM posts
         WHERE artist=?
         ORDER BY created_at DESC
@@ -425,6 +869,8 @@ def artist_profile(request: Request, artist_name: str):
     # Fetch artist bio (match case-insensitive)
     c.execute("SELECT bio FROM users WHERE LOWER(username)=LOWER(?)", (artist_name,))
     r_bio = c.fetchone()
+    # Counters ride along: likes and follows bump ("artist", name) as well
+    stats = artist_stats.get(artist_name, conn)
     conn.close()
     posts = []
     for r in rows:
@@ -435,11 +881,27 @@ def artist_profile(request: Request, artist_name: str):
             "artist": r[3],
             "price": r[4],
             "created_at": r[5],
-            "like_count": r[6] or 0,
         })
+    entry = {
+        "artist_bio": (r_bio[0] if r_bio else ""),
+        "stats": stats,
+        "grid_html": _render_fragment("artist_grid", posts=posts, show_like=show_like),
+        "post_ids": [p["id"] for p in posts],
+    }
+    page_cache.put(key, entry, [("artist", artist_name)], versions)
+    return entry
+
+@app.get("/artist/{artist_name}", response_class=HTMLResponse)
+def artist_profile(request: Request, artist_name: str):
     user = request.cookies.get("user")
-    following = is_following(user, artist_name) if user else False
-    return templates.TemplateResponse("artist.html", {"request": request, "user": user, "artist": artist_name, "posts": posts, "following": following, "artist_bio": (r_bio[0] if r_bio else "")})
+    entry = cached_artist_page(artist_name, show_like=bool(user))
+    following, liked = viewer_state(user, artist_name, entry["post_ids"])
+    liked_ids = sorted(liked)
+    return templates.TemplateResponse("artist.html", {"request": request, "user": user, "artist": artist_name, "following": following, "artist_bio": entry["artist_bio"], "grid_html": entry["grid_html"], "stats": entry["stats"], "liked_ids": liked_ids})
+
+@app.get("/api/artist/{artist_name}/stats")
+def api_artist_stats(artist_name: str):
+    return JSONResponse({"artist": artist_name, **artist_stats.get(artist_name)})
 
 # ----------------------------
 # Create Post Endpoint
@@ -465,101 +927,253 @@ async def create_post(
     files = image or []
     if files:
         for file in files:
-            ext = os.path.splitext(file.filename)[1] or ".jpg"
-            fname = f"{uuid.uuid4().hex}{ext}"
-            dest = os.path.join(UPLOAD_DIR, fname)
-            with open(dest, "wb") as f:
-                content = await file.read()
-                f.write(content)
-            image_url = f"/static/uploads/{fname}"
+            content = await file.read()
+            # Content-addressed name: same bytes -> same URL, cacheable forever
+            image_url = uploads.save_upload(content, file.filename)
             images_list.append(image_url)
         
         # Use first image as primary for backward compatibility
         image_path = images_list[0] if images_list else None
 
+    # Every uploaded image is tagged (concurrently) and the tags merged into one prompt
+    full_image_paths = [uploads.url_to_path(url) for url in images_list]
+    full_image_path = full_image_paths[0] if full_image_paths else None
+
     # Call AI provider in background
     def generate_and_save():
-        full_image_path = os.path.join(os.getcwd(), image_path.lstrip('/')) if image_path else None
-        if full_image_path and idea_text:
-            story, purpose, artist = ai_provider.generate_from_image_and_text(full_image_path, idea_text)
-        elif full_image_path:
-            story, purpose, artist = ai_provider.generate_from_image(full_image_path)
-        else:
-            story, purpose, artist = ai_provider.generate_from_text(idea_text or "")
+        # Batched: concurrent uploads share one Gemini request (see ai_provider.StoryBatcher)
+        story, purpose, artist = ai_provider.generate_batched(full_image_paths, idea_text or "")
         # Prefer the logged-in username as artist; fallback to AI value
         artist_name = user or artist or ""
         # If AI failed to return story, fall back to user's prompt so detail page isn't empty
         if not story:
             story = idea_text or ""
-        insert_post(image_path, title, idea_text, story, purpose, artist_name, price, contact, category, images_list)
+        post_id = insert_post(image_path, title, idea_text, story, purpose, artist_name, price, contact, category, images_list)
+        similarity.index_post(post_id, full_image_path)
+
+    if not AI_STREAM_STORIES:
+        background_tasks.add_task(generate_and_save)
+        return JSONResponse({"status": "ok", "message": "Post submitted. Story will be generated shortly."})
+
+    # Streaming: create the post now and fill in the story as it is generated
+    post_id = insert_post(image_path, title, idea_text, "", "", user, price, contact, category, images_list)
+    stream = StoryStream()
+    story_streams[post_id] = stream
+
+    def generate_and_stream():
+        try:
+            story, purpose, artist = ai_provider.generate_streamed(full_image_paths, idea_text or "", stream.update)
+        except Exception as e:
+            print("Story generation failed:", e)
+            story, purpose, artist = "", "", ""
+        if not story:
+            story = idea_text or ""
+        update_post_story(post_id, story, purpose, user or artist or "")
+        stream.finish(story)
+        story_streams.pop(post_id, None)
+        similarity.index_post(post_id, full_image_path)
 
-    background_tasks.add_task(generate_and_save)
-    return JSONResponse({"status": "ok", "message": "Post submitted. Story will be generated shortly."})
+    background_tasks.add_task(generate_and_stream)
+    return JSONResponse({"status": "ok", "post_id": post_id, "message": "Post submitted. Story is being written..."})
 
 # ----------------------------
-# Feed API
+# Story stream (Server-Sent Events)
 # ----------------------------
-@app.get("/feed_api")
-def feed_api(request: Request, following: int = 0, category: str = ""):
-    user = request.cookies.get("user")
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Build the base query with like_count as a subquery
-    base_query = (
-        "SELECT id, image_path, title, artist, price, category, created_at, "
-        "(SELECT COUNT(*) FROM likes l WHERE l.post_id = posts.id) AS like_count "
-        "FROM posts"
+STORY_STREAM_POLL = 0.1
+STORY_STREAM_TIMEOUT = 120
+
+@app.get("/api/post/{post_id}/story_stream")
+async def story_stream(post_id: int):
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def read_story():
+        conn = get_conn()
+        c = conn.cursor()
+        c.execute("SELECT story FROM posts WHERE id=?", (post_id,))
+        row = c.fetchone()
+        conn.close()
+        return row
+
+    async def events():
+        sent = ""
+        waited = 0.0
+        while waited < STORY_STREAM_TIMEOUT:
+            stream = story_streams.get(post_id)
+            if stream is not None:
+                text, done = stream.snapshot()
+            else:
+                # Generated by another worker (or already finished): fall back to the DB record,
+                # read off the event loop
+                row = await run_in_threadpool(read_story)
+                if row is None:
+                    yield sse("error", {"message": "Post not found"})
+                    return
+                text, done = row[0] or "", bool(row[0])
+            if text.startswith(sent) and len(text) > len(sent):
+                yield sse("chunk", {"text": text[len(sent):]})
+                sent = text
+            elif text != sent and text:
+                # Story was rewritten (e.g. fallback text); replace what the client has
+                yield sse("reset", {"text": text})
+                sent = text
+            if done:
+                yield sse("done", {})
+                return
+            interval = STORY_STREAM_POLL if stream is not None else 1.0
+            await asyncio.sleep(interval)
+            waited += interval
+        yield sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
+
+# ----------------------------
+# Feed API
+# ----------------------------
+TRENDING_PAGE_SIZE = 100
+# Posts per page of the "All" feed (server-rendered first page, then /feed_api?before=...)
+FEED_PAGE_SIZE = int(os.getenv("FEED_PAGE_SIZE", "24") or 24)
+
+def _search_condition(q):
+    """Case-insensitive substring match over the fields the feed's search box covers."""
+    pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    fields = ("p.title", "p.artist", "p.category", "p.created_at")
+    return "(" + " OR ".join(f"{f} LIKE ? ESCAPE '\\'" for f in fields) + ")", [pattern] * len(fields)
+
+def _latest_posts_query(user, category="", before=0, limit=0, q=""):
+    """Newest-first post cards; before=<post id> continues after that post (keyset cursor)."""
     where_conditions = []
-    params = []
-    
-    if following:
-        if not user:
-            conn.close()
-            return JSONResponse({"error": "login required"}, status_code=401)
-        where_conditions.append("LOWER(TRIM(artist)) IN (SELECT artist FROM follows WHERE follower=?)")
-        params.append(user.lower())
-    
+    params = [user or ""]
     if category:
-        where_conditions.append("category = ?")
+        where_conditions.append("p.category = ?")
         params.append(category)
-    
+    if q:
+        condition, search_params = _search_condition(q)
+        where_conditions.append(condition)
+        params.extend(search_params)
+    if before:
+        where_conditions.append("(p.created_at, p.id) < (SELECT created_at, id FROM posts WHERE id = ?)")
+        params.append(before)
+    query = f"SELECT {POST_CARD_JSON} FROM posts p"
     if where_conditions:
-        query = f"{base_query} WHERE {' AND '.join(where_conditions)} ORDER BY created_at DESC"
-    else:
-        query = f"{base_query} ORDER BY created_at DESC"
-    
+        query += f" WHERE {' AND '.join(where_conditions)}"
+    query += " ORDER BY p.created_at DESC, p.id DESC"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, params
+
+def load_feed_page(user, before=0, limit=FEED_PAGE_SIZE):
+    query, params = _latest_posts_query(user, before=before, limit=limit)
+    conn = get_conn()
+    c = conn.cursor()
     c.execute(query, params)
-    rows = c.fetchall()
+    posts = [json.loads(r[0]) for r in c.fetchall()]
     conn.close()
-    posts = []
-    for r in rows:
-        posts.append({
-            "id": r[0],
-            "image": r[1],
-            "title": r[2],
-            "artist": r[3],
-            "price": r[4],
-            "category": r[5],
-            "created_at": r[6],
-            "like_count": r[7] or 0,
-        })
-    return JSONResponse(posts)
+    return posts
+
+@app.get("/feed_api")
+def feed_api(request: Request, following: int = 0, category: str = "", stream: int = 0, sort: str = "",
+             before: int = 0, limit: int = 0, q: str = ""):
+    user = request.cookies.get("user")
+    q = q.strip()
+    if sort == "trending":
+        # Ranked by the materialized score table; idx_post_scores_score drives the ordering
+        where_conditions = []
+        params = [user or ""]
+        if category:
+            where_conditions.append("p.category = ?")
+            params.append(category)
+        if q:
+            condition, search_params = _search_condition(q)
+            where_conditions.append(condition)
+            params.extend(search_params)
+        query = f"""
+            SELECT {POST_CARD_JSON}
+            FROM post_scores s
+            JOIN posts p ON p.id = s.post_id
+            {"WHERE " + " AND ".join(where_conditions) if where_conditions else ""}
+            ORDER BY s.score DESC
+            LIMIT ?
+            """
+        params.append(TRENDING_PAGE_SIZE)
+        return json_rows_response(query, params, stream=bool(stream))
+
+    if following:
+        if not user:
+            return JSONResponse({"error": "login required"}, status_code=401)
+        return following_feed(user, category, stream=bool(stream), q=q)
+
+    # limit=0 keeps the old "everything at once" response for existing clients
+    query, params = _latest_posts_query(user, category, before=before, limit=max(0, limit), q=q)
+    return json_rows_response(query, params, stream=bool(stream))
+
+def following_feed(user, category="", stream=False, q=""):
+    follower_key = user.lower()
+    # One connection for the fan-out lookup and the feed query
+    conn = get_conn(check_same_thread=not stream)
+    merge_artists = timelines.fanout_on_read_artists(conn.cursor(), follower_key)
+    post_filter = "AND p.category = ?" if category else ""
+    filter_params = [category] if category else []
+    if q:
+        condition, search_params = _search_condition(q)
+        post_filter += f" AND {condition}"
+        filter_params += search_params
+    if not merge_artists:
+        # Common case: one range read over the user's materialized timeline
+        query = f"""
+            SELECT {POST_CARD_JSON}
+            FROM timelines t
+            JOIN posts p ON p.id = t.post_id
+            WHERE t.user = ? {post_filter}
+            ORDER BY t.post_id DESC
+            """
+        params = [user, follower_key] + filter_params
+        return json_rows_response(query, params, stream=stream, conn=conn)
+    # Artists with very large followings are not fanned out on write; merge their posts here
+    placeholders = ",".join(["?"] * len(merge_artists))
+    query = f"""
+        SELECT {POST_CARD_JSON}
+        FROM posts p
+        WHERE p.id IN (
+            SELECT post_id FROM timelines WHERE user = ?
+            UNION
+            SELECT id FROM posts WHERE LOWER(TRIM(artist)) IN ({placeholders})
+        ) {post_filter}
+        ORDER BY p.id DESC
+        """
+    params = [user, follower_key] + merge_artists + filter_params
+    return json_rows_response(query, params, stream=stream, conn=conn)
 
 # ----------------------------
 # Likes: APIs and page
 # ----------------------------
+def _post_artist_event(c, post_id):
+    """The ("artist", name) whose cached profile counts a like on post_id."""
+    c.execute("SELECT artist FROM posts WHERE id=?", (post_id,))
+    row = c.fetchone()
+    return [("artist", row[0])] if row and row[0] else []
+
 @app.post("/api/like")
 def api_like(request: Request, post_id: int = Form(...)):
     user = request.cookies.get("user")
     if not user:
         return JSONResponse({"status": "error", "message": "Login required"}, status_code=401)
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     try:
         c.execute("INSERT OR IGNORE INTO likes (user, post_id) VALUES (?, ?)", (user, post_id))
+        events = [("post", post_id)]
+        if c.rowcount:
+            trending.on_like(c, post_id)
+            artist_stats.on_like(c, post_id)
+            events += _post_artist_event(c, post_id)
         conn.commit()
+        cache_sync.invalidate(*events)
         return JSONResponse({"status": "ok", "liked": True})
     finally:
         conn.close()
@@ -569,60 +1183,62 @@ def api_unlike(request: Request, post_id: int = Form(...)):
     user = request.cookies.get("user")
     if not user:
         return JSONResponse({"status": "error", "message": "Login required"}, status_code=401)
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     try:
-        c.execute("DELETE FROM likes WHERE user=? AND post_id=?", (user, post_id))
+        c.execute("SELECT created_at FROM likes WHERE user=? AND post_id=?", (user, post_id))
+        row = c.fetchone()
+        events = [("post", post_id)]
+        if row:
+            c.execute("DELETE FROM likes WHERE user=? AND post_id=?", (user, post_id))
+            trending.on_unlike(c, post_id, row[0])
+            artist_stats.on_unlike(c, post_id)
+            events += _post_artist_event(c, post_id)
         conn.commit()
+        cache_sync.invalidate(*events)
         return JSONResponse({"status": "ok", "liked": False})
     finally:
         conn.close()
 
+def liked_post_ids(user, post_ids, conn=None) -> set:
+    """The subset of post_ids liked by user (one lookup on the likes(user, post_id) index)."""
+    if not user or not post_ids:
+        return set()
+    own = conn is None
+    conn = conn or get_conn()
+    c = conn.cursor()
+    placeholders = ",".join(["?"] * len(post_ids))
+    c.execute(f"SELECT post_id FROM likes WHERE user=? AND post_id IN ({placeholders})", [user] + list(post_ids))
+    ids = {r[0] for r in c.fetchall()}
+    if own:
+        conn.close()
+    return ids
+
 @app.get("/api/my_liked_ids")
 def api_my_liked_ids(request: Request):
     user = request.cookies.get("user")
     if not user:
         return JSONResponse({"error": "login required"}, status_code=401)
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute("SELECT post_id FROM likes WHERE user=?", (user,))
     ids = [r[0] for r in c.fetchall()]
     conn.close()
-    return JSONResponse(ids)
+    return FastJSONResponse(ids)
 
 @app.get("/api/my_likes")
-def api_my_likes(request: Request):
+def api_my_likes(request: Request, stream: int = 0):
     user = request.cookies.get("user")
     if not user:
         return JSONResponse({"error": "login required"}, status_code=401)
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
-        """
-        SELECT p.id, p.image_path, p.title, p.artist, p.price, p.category, p.created_at,
-               (SELECT COUNT(*) FROM likes l2 WHERE l2.post_id = p.id) AS like_count
+    query = f"""
+        SELECT {POST_CARD_JSON}
         FROM posts p
         JOIN likes l ON l.post_id = p.id
         WHERE l.user = ?
         ORDER BY l.created_at DESC
-        """,
-        (user,)
-    )
-    rows = c.fetchall()
-    conn.close()
-    posts = []
-    for r in rows:
-        posts.append({
-            "id": r[0],
-            "image": r[1],
-            "title": r[2],
-            "artist": r[3],
-            "price": r[4],
-            "category": r[5],
-            "created_at": r[6],
-            "like_count": r[7] or 0,
-        })
-    return JSONResponse(posts)
+        """
+    return json_rows_response(query, (user, user), stream=bool(stream))
 
 @app.get("/my_likes", response_class=HTMLResponse)
 def my_likes_page(request: Request):
@@ -639,7 +1255,7 @@ def chat_contacts(request: Request):
     user = request.cookies.get("user")
     if not user:
         return JSONResponse({"error": "login required"}, status_code=401)
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     # mutual follows: X such that user follows X and X follows user
     c.execute(
@@ -663,18 +1279,20 @@ def chat_messages(request: Request, with_user: str, limit: int = 50):
         return JSONResponse({"error": "login required"}, status_code=401)
     if not is_mutual_follow(user, with_user):
         return JSONResponse({"error": "not allowed"}, status_code=403)
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
-    c.execute(
-        """
+    # Older messages live in the archive database (see retention.py); UNION drops the
+    # duplicate left behind if an archival batch was interrupted
+    tables = ["main.messages"] + (["archive.messages"] if retention.attach_archive(conn) else [])
+    pair = """
         SELECT id, sender, receiver, content, created_at
-        FROM messages
+        FROM {table}
         WHERE (LOWER(sender)=LOWER(?) AND LOWER(receiver)=LOWER(?))
            OR (LOWER(sender)=LOWER(?) AND LOWER(receiver)=LOWER(?))
-        ORDER BY created_at ASC, id ASC
-        LIMIT ?
-        """,
-        (user, with_user, with_user, user, limit),
+    """
+    c.execute(
+        " UNION ".join(pair.format(table=t) for t in tables) + " ORDER BY created_at ASC, id ASC LIMIT ?",
+        (user, with_user, with_user, user) * len(tables) + (limit,),
     )
     rows = c.fetchall()
     conn.close()
@@ -682,7 +1300,7 @@ def chat_messages(request: Request, with_user: str, limit: int = 50):
         {"id": r[0], "sender": r[1], "receiver": r[2], "content": r[3], "created_at": r[4]}
         for r in rows
     ]
-    return JSONResponse(messages)
+    return FastJSONResponse(messages)
 
 @app.post("/api/chat/send")
 def chat_send(request: Request, to: str = Form(...), content: str = Form(...)):
@@ -693,7 +1311,7 @@ def chat_send(request: Request, to: str = Form(...), content: str = Form(...)):
         return JSONResponse({"error": "empty"}, status_code=400)
     if not is_mutual_follow(user, to):
         return JSONResponse({"error": "not allowed"}, status_code=403)
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute(
         "INSERT INTO messages (sender, receiver, content, created_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
@@ -709,7 +1327,7 @@ def chat_send(request: Request, to: str = Form(...), content: str = Form(...)):
 # ----------------------------
 @app.get("/debug_latest")
 def debug_latest():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute("SELECT id, image_path, title, idea_text, story, purpose, artist, price, contact, created_at FROM posts ORDER BY created_at DESC LIMIT 1")
     row = c.fetchone()
@@ -740,7 +1358,7 @@ def signup_get(request: Request):
 def signup_post(username: str = Form(...), email: str = Form(...), password: str = Form(...), phone: str = Form(""), bio: str = Form("")):
     password_hash = pwd_context.hash(password)
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_conn()
         c = conn.cursor()
         c.execute("INSERT INTO users (username, email, password_hash, phone, bio) VALUES (?, ?, ?, ?, ?)",
                   (username, email, password_hash, phone, bio))
@@ -756,7 +1374,7 @@ def login_get(request: Request):
 
 @app.post("/login")
 def login_post(username: str = Form(...), password: str = Form(...)):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute("SELECT password_hash FROM users WHERE username = ?", (username,))
     row = c.fetchone()
@@ -776,7 +1394,7 @@ def profile_get(request: Request):
     user = request.cookies.get("user")
     if not user:
         return RedirectResponse(url="/login", status_code=303)
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute("SELECT username, email, phone, bio FROM users WHERE username=?", (user,))
     row = c.fetchone()
@@ -790,7 +1408,7 @@ def profile_post(request: Request, email: str = Form(...), phone: str = Form("")
     user = request.cookies.get("user")
     if not user:
         return RedirectResponse(url="/login", status_code=303)
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     if password:
         password_hash = pwd_context.hash(password)
@@ -799,6 +1417,7 @@ def profile_post(request: Request, email: str = Form(...), phone: str = Form("")
         c.execute("UPDATE users SET email=?, phone=?, bio=? WHERE username=?", (email, phone, bio, user))
     conn.commit()
     conn.close()
+    cache_sync.invalidate(("artist", user))
     return RedirectResponse(url="/profile", status_code=303)
 
 @app.get("/following", response_class=HTMLResponse)
@@ -806,7 +1425,7 @@ def following_get(request: Request):
     user = request.cookies.get("user")
     if not user:
         return RedirectResponse(url="/login", status_code=303)
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_conn()
     c = conn.cursor()
     c.execute("SELECT artist FROM follows WHERE follower=? ORDER BY artist ASC", (user.lower(),))
     artists = [r[0] for r in c.fetchall()]
@@ -814,7 +1433,6 @@ def following_get(request: Request):
     bios = {}
     if artists:
         placeholders = ",".join(["?"] * len(artists))
-        c = sqlite3.connect(DB_PATH).cursor()
         c.execute(f"SELECT username, bio FROM users WHERE LOWER(username) IN ({placeholders})", [a for a in artists])
         for name, bio in c.fetchall():
             bios[name.lower()] = bio or ""
@@ -832,39 +1450,18 @@ def logout():
     return resp
 
 @app.get("/api/my_posts")
-def get_my_posts(request: Request):
+def get_my_posts(request: Request, stream: int = 0):
     user = request.cookies.get("user")
     if not user:
         return JSONResponse({"error": "login required"}, status_code=401)
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
+    query = f"""
+        SELECT {POST_CARD_JSON}
+        FROM posts p
+        WHERE p.artist=?
+        ORDER BY p.created_at DESC
         """
-        SELECT id, image_path, title, artist, price, category, created_at,
-               (SELECT COUNT(*) FROM likes l WHERE l.post_id = posts.id) AS like_count
-        FROM posts
-        WHERE artist=?
-        ORDER BY created_at DESC
-        """,
-        (user,)
-    )
-    rows = c.fetchall()
-    conn.close()
-    
-    posts = []
-    for r in rows:
-        posts.append({
-            "id": r[0],
-            "image": r[1],
-            "title": r[2],
-            "artist": r[3],
-            "price": r[4],
-            "category": r[5],
-            "created_at": r[6],
-            "like_count": r[7] or 0,
-        })
-    return JSONResponse(posts)
+    return json_rows_response(query, (user, user), stream=bool(stream))
 
 @app.post("/generate_art_api")
 async def generate_art_api(request: Request):
@@ -879,6 +1476,7 @@ async def generate_art_api(request: Request):
 
     # Call SubNP Free API (SSE streaming) and collect final image URL
     api_url = "https://subnp.com/api/free/generate"
+    started = time.perf_counter()
     try:
         async with httpx.AsyncClient(timeout=None) as client:
             # Send POST with prompt and model
@@ -909,9 +1507,12 @@ async def generate_art_api(request: Request):
                     elif status == "error":
                         error_message = payload.get("message") or "Generation failed"
                         break
+            metrics.PROVIDER_REQUEST_DURATION.observe(time.perf_counter() - started, provider="subnp", operation="generate")
             if error_message:
+                metrics.PROVIDER_ERRORS.inc(provider="subnp", operation="generate")
                 return JSONResponse({"status": "error", "message": error_message}, status_code=502)
             if not image_url:
+                metrics.PROVIDER_ERRORS.inc(provider="subnp", operation="generate")
                 return JSONResponse({"status": "error", "message": "No image returned by provider."}, status_code=502)
             # Optionally create a short summary from the prompt
             summary = (
@@ -924,14 +1525,18 @@ async def generate_art_api(request: Request):
                 "summary": summary
             })
     except httpx.HTTPError as e:
+        metrics.PROVIDER_REQUEST_DURATION.observe(time.perf_counter() - started, provider="subnp", operation="generate")
+        metrics.PROVIDER_ERRORS.inc(provider="subnp", operation="generate")
         return JSONResponse({"status": "error", "message": f"Upstream error: {str(e)}"}, status_code=502)
 
 @app.get("/free_models")
 async def free_models():
     """Proxy SubNP free models list to avoid CORS issues in the browser."""
+    started = time.perf_counter()
     try:
         async with httpx.AsyncClient() as client:
             r = await client.get("https://subnp.com/api/free/models")
+            metrics.PROVIDER_REQUEST_DURATION.observe(time.perf_counter() - started, provider="subnp", operation="models")
             r.raise_for_status()
             data = r.json()
             # Normalize to a simple list if needed
@@ -946,4 +1551,5 @@ async def free_models():
                 filtered.append(m)
             return JSONResponse({"success": True, "models": filtered})
     except httpx.HTTPError as e:
+        metrics.PROVIDER_ERRORS.inc(provider="subnp", operation="models")
         return JSONResponse({"success": False, "error": str(e)}, status_code=502)
@@ -0,0 +1,129 @@
+# artist_stats.py
+# Per-artist counters (posts, likes received, followers, following) kept in artist_stats.
+#
+# Writers update the row inside their own transaction (insert_post, like/unlike,
+# follow/unfollow), so profile views read one primary-key row instead of running COUNT
+# scans over posts, likes and follows. Artists are keyed by LOWER(TRIM(name)), like follows.
+from db import get_conn
+
+COLUMNS = ("posts", "likes_received", "followers", "following")
+
+
+def ensure_tables(c):
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS artist_stats (
+            artist TEXT PRIMARY KEY,
+            posts INTEGER NOT NULL DEFAULT 0,
+            likes_received INTEGER NOT NULL DEFAULT 0,
+            followers INTEGER NOT NULL DEFAULT 0,
+            following INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _key(name):
+    return (name or "").strip().lower()
+
+
+def _add(c, artist_key, column, delta):
+    if not artist_key:
+        return
+    c.execute(
+        f"""
+        INSERT INTO artist_stats (artist, {column}) VALUES (?, MAX(?, 0))
+        ON CONFLICT(artist) DO UPDATE SET {column} = MAX({column} + ?, 0)
+        """,
+        (artist_key, delta, delta),
+    )
+
+
+# ----------------------
+# Incremental updates (run inside the caller's transaction)
+# ----------------------
+def on_new_post(c, artist):
+    _add(c, _key(artist), "posts", 1)
+
+
+def on_like(c, post_id, delta=1):
+    # One statement: resolve the post's artist and upsert (the WHERE clause lets ON CONFLICT parse)
+    c.execute(
+        """
+        INSERT INTO artist_stats (artist, likes_received)
+        SELECT LOWER(TRIM(artist)), MAX(?, 0) FROM posts WHERE id=? AND TRIM(COALESCE(artist, '')) != ''
+        ON CONFLICT(artist) DO UPDATE SET likes_received = MAX(likes_received + ?, 0)
+        """,
+        (delta, post_id, delta),
+    )
+
+
+def on_unlike(c, post_id):
+    on_like(c, post_id, -1)
+
+
+def on_follow(c, follower_key, artist_key, delta=1):
+    _add(c, artist_key, "followers", delta)
+    _add(c, follower_key, "following", delta)
+
+
+def on_unfollow(c, follower_key, artist_key):
+    on_follow(c, follower_key, artist_key, -1)
+
+
+# ----------------------
+# Reads
+# ----------------------
+def get(artist, conn=None) -> dict:
+    """conn: an open connection to read on (left open for the caller)."""
+    own = conn is None
+    conn = conn or get_conn()
+    c = conn.cursor()
+    c.execute(f"SELECT {', '.join(COLUMNS)} FROM artist_stats WHERE artist=?", (_key(artist),))
+    row = c.fetchone()
+    if own:
+        conn.close()
+    return dict(zip(COLUMNS, row or (0,) * len(COLUMNS)))
+
+
+# ----------------------
+# Maintenance
+# ----------------------
+def rebuild():
+    """Recompute every artist's counters from posts, likes and follows."""
+    conn = get_conn()
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        c.execute("DELETE FROM artist_stats")
+        c.execute(
+            """
+            INSERT INTO artist_stats (artist, posts, likes_received, followers, following)
+            SELECT artist, SUM(posts), SUM(likes), SUM(followers), SUM(following) FROM (
+                SELECT LOWER(TRIM(artist)) AS artist, 1 AS posts, 0 AS likes, 0 AS followers, 0 AS following
+                FROM posts
+                UNION ALL
+                SELECT LOWER(TRIM(p.artist)), 0, 1, 0, 0 FROM likes l JOIN posts p ON p.id = l.post_id
+                UNION ALL
+                SELECT artist, 0, 0, 1, 0 FROM follows
+                UNION ALL
+                SELECT follower, 0, 0, 0, 1 FROM follows
+            )
+            WHERE artist IS NOT NULL AND artist != ''
+            GROUP BY artist
+            """
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def ensure_stats():
+    """Populate artist_stats the first time it is deployed against existing data."""
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("SELECT EXISTS(SELECT 1 FROM artist_stats), EXISTS(SELECT 1 FROM posts) OR EXISTS(SELECT 1 FROM follows)")
+    has_stats, has_data = c.fetchone()
+    conn.close()
+    if has_data and not has_stats:
+        rebuild()
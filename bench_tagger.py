@@ -0,0 +1,46 @@
+# bench_tagger.py
+# Compare image-tagging latency: local CPU tagger vs. Google Vision.
+#
+#   python bench_tagger.py [image ...]      (defaults to static/uploads)
+import os
+import sys
+import glob
+import time
+import statistics
+
+import ai_provider
+import image_tags
+
+
+def _bench(name, fn, paths, rounds):
+    timings = []
+    sample = []
+    empty = 0
+    for _ in range(rounds):
+        for path in paths:
+            started = time.perf_counter()
+            tags = fn(path)
+            timings.append((time.perf_counter() - started) * 1000)
+            sample = sample or tags
+            empty += not tags
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+    print(f"{name:<22} n={len(timings):<4} mean={statistics.mean(timings):8.1f} ms  "
+          f"p50={statistics.median(timings):8.1f} ms  p95={p95:8.1f} ms  empty={empty}")
+    print(f"{'':<22} e.g. {', '.join(sample[:6]) or '(no tags)'}")
+
+
+def main():
+    upload_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "uploads")
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(upload_dir, "**", "*.*"), recursive=True))
+    if not paths:
+        print("No images found")
+        return
+    image_tags.warm_up()  # exclude process start-up from the numbers
+    _bench("local (in-process)", image_tags.tag_image, paths, rounds=3)
+    _bench("local (process pool)", image_tags.extract_local_tags, paths, rounds=3)
+    _bench("vision api", ai_provider.vision_image_tags, paths, rounds=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# cache_sync.py
+# Cross-worker cache invalidation through SQLite (no external service).
+#
+# invalidate() drops the entry in this process right away and appends an event to
+# cache_events. Every worker runs a poller that checks PRAGMA data_version (which only
+# changes when another connection commits) every CACHE_SYNC_INTERVAL seconds and, when it
+# moved, applies the new events to its own caches. Other workers are therefore stale for at
+# most about one interval.
+import os
+import json
+import socket
+import time
+import threading
+
+import page_cache
+from db import get_conn
+
+CACHE_SYNC_INTERVAL = float(os.getenv("CACHE_SYNC_INTERVAL", "1.0") or 1.0)
+# Events older than this are pruned; workers only ever need the last few intervals
+CACHE_EVENT_TTL = 600
+
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}"
+
+# kind -> callbacks(ident) run when another worker publishes an event of that kind
+_handlers = {}
+
+
+def ensure_tables(c):
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cache_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            ident TEXT NOT NULL,
+            origin TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """
+    )
+
+
+def on_event(kind, handler):
+    _handlers.setdefault(kind, []).append(handler)
+
+
+def _apply(kind, ident):
+    page_cache.bump(kind, ident)
+    for handler in _handlers.get(kind, []):
+        try:
+            handler(ident)
+        except Exception as e:
+            print(f"Cache sync handler for {kind} failed:", e)
+
+
+def publish(events):
+    """Record [(kind, ident)] so other workers drop their copies."""
+    if not events:
+        return
+    now = time.time()
+    conn = get_conn()
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO cache_events (kind, ident, origin, created_at) VALUES (?, ?, ?, ?)",
+        [(kind, json.dumps(ident), ORIGIN, now) for kind, ident in events],
+    )
+    conn.commit()
+    conn.close()
+
+
+def invalidate(*events):
+    """invalidate(("post", 12), ("artist", "sohan")): bump locally and notify other workers."""
+    for kind, ident in events:
+        page_cache.bump(kind, ident)
+    publish(events)
+
+
+# ----------------------
+# Poller
+# ----------------------
+def _poll_forever(interval):
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("SELECT COALESCE(MAX(seq), 0) FROM cache_events")
+    last_seq = c.fetchone()[0]
+    c.execute("PRAGMA data_version")
+    data_version = c.fetchone()[0]
+    last_prune = time.time()
+    while True:
+        time.sleep(interval)
+        try:
+            c.execute("PRAGMA data_version")
+            current = c.fetchone()[0]
+            if current != data_version:
+                data_version = current
+                c.execute(
+                    "SELECT seq, kind, ident, origin FROM cache_events WHERE seq > ? ORDER BY seq",
+                    (last_seq,),
+                )
+                for seq, kind, ident, origin in c.fetchall():
+                    last_seq = seq
+                    if origin != ORIGIN:
+                        _apply(kind, json.loads(ident))
+            if time.time() - last_prune > 60:
+                last_prune = time.time()
+                c.execute("DELETE FROM cache_events WHERE created_at < ?", (time.time() - CACHE_EVENT_TTL,))
+                conn.commit()
+        except Exception as e:
+            print("Cache sync poll failed:", e)
+
+
+def start(interval: float = CACHE_SYNC_INTERVAL):
+    thread = threading.Thread(target=_poll_forever, args=(interval,), name="cache-sync", daemon=True)
+    thread.start()
+    return thread
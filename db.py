@@ -0,0 +1,95 @@
+# db.py
+import os
+import sqlite3
+import time
+import contextvars
+
+import metrics
+
+DB_PATH = os.getenv("ARTFEED_DB") or os.path.join(os.path.dirname(__file__), "artfeed.db")
+
+# Debug/profiling: record every statement, log slow ones with their query plan,
+# and report per-request query counts (see app.sql_trace_middleware)
+SQL_TRACE = os.getenv("SQL_TRACE", "0") == "1"
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "50") or 50)
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "5") or 5)
+
+_request_trace = contextvars.ContextVar("sql_request_trace", default=None)
+
+
+# ----------------------------
+# Instrumented connection (counts and times every statement)
+# ----------------------------
+def _statement_kind(sql: str) -> str:
+    words = (sql or "").split(None, 1)
+    return words[0].upper() if words else ""
+
+
+def _record(cursor, sql, parameters, started):
+    elapsed = time.perf_counter() - started
+    kind = _statement_kind(sql)
+    metrics.DB_QUERIES.inc(kind=kind)
+    metrics.DB_QUERY_DURATION.observe(elapsed, kind=kind)
+    if SQL_TRACE:
+        _trace(cursor, sql, parameters, kind, elapsed)
+
+
+def _trace(cursor, sql, parameters, kind, elapsed):
+    trace = _request_trace.get()
+    if trace is not None:
+        trace.append((" ".join(sql.split()), elapsed))
+    elapsed_ms = elapsed * 1000
+    if elapsed_ms < SQL_SLOW_MS:
+        return
+    print(f"Slow query ({elapsed_ms:.1f} ms): {' '.join(sql.split())}")
+    if kind in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE") and parameters is not None:
+        try:
+            # Plain sqlite3 cursor so the plan lookup itself is not traced
+            plan = sqlite3.Connection.cursor(cursor.connection).execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+            for row in plan.fetchall():
+                print("    plan:", row[-1])
+        except sqlite3.Error as e:
+            print("    plan unavailable:", e)
+
+
+def start_request_trace():
+    return _request_trace.set([])
+
+
+def end_request_trace(token):
+    """Stop tracing in this context. The returned list is the live trace: queries still running
+    under the request (e.g. while a streamed body is produced) keep being appended to it."""
+    trace = _request_trace.get()
+    _request_trace.reset(token)
+    return trace if trace is not None else []
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record(self, sql, parameters, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record(self, sql, None, started)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def get_conn(path: str = DB_PATH, check_same_thread: bool = True) -> sqlite3.Connection:
+    return sqlite3.connect(path, factory=TimedConnection, check_same_thread=check_same_thread)
@@ -0,0 +1,149 @@
+# image_tags.py
+# Local, network-free image tagger (NumPy + Pillow).
+#
+# Produces short descriptive tags (dominant color names, brightness/contrast,
+# saturation, aspect and texture hints) that can stand in for Vision API labels
+# in the story prompts. Work runs in a process pool so it never holds the GIL
+# of the web workers.
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:  # optional: without numpy/Pillow the local tagger returns no tags
+    np = None
+    Image = None
+
+LOCAL_TAGGER_WORKERS = int(os.getenv("LOCAL_TAGGER_WORKERS", "0") or 0) or min(4, os.cpu_count() or 1)
+LOCAL_TAGGER_TIMEOUT = float(os.getenv("LOCAL_TAGGER_TIMEOUT", "10") or 10)
+
+# Reference colors used to name dominant colors
+COLOR_NAMES = {
+    "black": (20, 20, 20),
+    "white": (240, 240, 240),
+    "gray": (128, 128, 128),
+    "red": (200, 30, 30),
+    "maroon": (120, 20, 30),
+    "orange": (240, 140, 30),
+    "yellow": (240, 220, 50),
+    "olive": (128, 128, 30),
+    "green": (40, 160, 60),
+    "teal": (30, 128, 128),
+    "blue": (40, 80, 200),
+    "navy": (20, 30, 90),
+    "purple": (120, 50, 160),
+    "pink": (240, 150, 190),
+    "brown": (120, 80, 40),
+    "beige": (220, 200, 160),
+}
+WARM_COLORS = {"red", "maroon", "orange", "yellow", "pink", "brown", "beige"}
+COOL_COLORS = {"blue", "navy", "teal", "green", "purple"}
+
+
+def tag_image(image_path: str) -> list[str]:
+    """Describe an image with simple visual tags. Runs in the caller's process."""
+    if np is None:
+        return []
+    with Image.open(image_path) as img:
+        width, height = img.size
+        rgb = np.asarray(img.convert("RGB").resize((64, 64), Image.BILINEAR), dtype=np.float32)
+
+    tags = []
+    pixels = rgb.reshape(-1, 3)
+
+    # Dominant colors: nearest named color per pixel, keep those covering >= 12%
+    names = list(COLOR_NAMES)
+    palette = np.array([COLOR_NAMES[n] for n in names], dtype=np.float32)
+    nearest = ((pixels[:, None, :] - palette[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    shares = np.bincount(nearest, minlength=len(names)) / len(nearest)
+    dominant = [names[i] for i in np.argsort(shares)[::-1][:3] if shares[i] >= 0.12]
+    tags.extend(f"{name} tones" for name in dominant)
+    warm = sum(shares[names.index(n)] for n in WARM_COLORS)
+    cool = sum(shares[names.index(n)] for n in COOL_COLORS)
+    if warm > 0.5:
+        tags.append("warm palette")
+    elif cool > 0.5:
+        tags.append("cool palette")
+
+    # Brightness and contrast from luminance
+    lum = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    brightness, contrast = lum.mean(), lum.std()
+    if brightness < 70:
+        tags.append("dark, moody lighting")
+    elif brightness > 180:
+        tags.append("bright, airy lighting")
+    if contrast > 65:
+        tags.append("high contrast")
+    elif contrast < 30:
+        tags.append("soft, low contrast")
+
+    # Saturation
+    mx, mn = pixels.max(axis=1), pixels.min(axis=1)
+    saturation = np.where(mx > 0, (mx - mn) / np.maximum(mx, 1), 0).mean()
+    if saturation < 0.08:
+        tags.append("monochrome")
+    elif saturation > 0.45:
+        tags.append("vibrant colors")
+    elif saturation < 0.2:
+        tags.append("muted colors")
+
+    # Aspect
+    ratio = width / height if height else 1.0
+    if ratio > 2:
+        tags.append("panoramic format")
+    elif ratio > 1.15:
+        tags.append("landscape format")
+    elif ratio < 0.87:
+        tags.append("portrait format")
+    else:
+        tags.append("square format")
+
+    # Texture: mean gradient magnitude of the luminance thumbnail
+    gray = lum.reshape(64, 64)
+    gradient = np.abs(np.diff(gray, axis=0)).mean() + np.abs(np.diff(gray, axis=1)).mean()
+    if gradient > 30:
+        tags.append("intricate, highly textured detail")
+    elif gradient < 8:
+        tags.append("smooth surfaces and gradients")
+    else:
+        tags.append("visible brushwork and texture")
+
+    return tags
+
+
+# ----------------------
+# Process pool
+# ----------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server is multithreaded, and a forked child can inherit
+            # locks (sqlite, logging, the import lock) held by other threads at fork time
+            _pool = ProcessPoolExecutor(max_workers=LOCAL_TAGGER_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def warm_up():
+    """Start the worker processes (and their numpy/Pillow imports) ahead of the first upload."""
+    if np is None:
+        raise RuntimeError("numpy/Pillow not installed")
+    _get_pool().submit(int, 0).result(timeout=LOCAL_TAGGER_TIMEOUT)
+
+
+def extract_local_tags(image_path: str) -> list[str]:
+    if np is None or not image_path:
+        return []
+    try:
+        return _get_pool().submit(tag_image, image_path).result(timeout=LOCAL_TAGGER_TIMEOUT)
+    except Exception as e:
+        print("Local image tagger failed:", e)
+        return []
@@ -0,0 +1,166 @@
+# import_catalog.py
+# Bulk import an artist's existing catalog.
+#
+#   python import_catalog.py <image_dir> <manifest.csv|manifest.jsonl> --artist NAME
+#
+# Manifest rows name an image file (relative to image_dir; several may be separated by ";")
+# and may set title, idea_text, price, contact, category and artist. Images are hashed and
+# copied in parallel, stories are generated through a bounded worker pool (sharing Gemini
+# requests via ai_provider's batcher), and posts are inserted one transaction per batch.
+# Each imported row is recorded in import_log inside that transaction, so re-running the
+# same command after an interruption skips what is already in.
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import ai_provider
+import app
+import similarity
+import uploads
+from db import get_conn
+
+FIELDS = ("title", "idea_text", "price", "contact", "category", "artist")
+
+
+def read_manifest(path):
+    if path.lower().endswith((".jsonl", ".ndjson")):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def ensure_import_log():
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS import_log (
+            key TEXT PRIMARY KEY,
+            post_id INTEGER NOT NULL,
+            imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+def already_imported(keys):
+    if not keys:
+        return set()
+    conn = get_conn()
+    c = conn.cursor()
+    placeholders = ",".join(["?"] * len(keys))
+    c.execute(f"SELECT key FROM import_log WHERE key IN ({placeholders})", list(keys))
+    done = {r[0] for r in c.fetchall()}
+    conn.close()
+    return done
+
+
+def prepare(image_dir, entry, default_artist):
+    """Copy the row's images into content-addressed storage; returns the post row plus its import key."""
+    names = [n.strip() for n in str(entry.get("image") or entry.get("images") or "").split(";") if n.strip()]
+    image_urls = []
+    for name in names:
+        with open(os.path.join(image_dir, name), "rb") as f:
+            image_urls.append(uploads.save_upload(f.read(), name))
+    row = {field: str(entry.get(field) or "").strip() for field in FIELDS}
+    row["artist"] = row["artist"] or default_artist
+    # Same artist + images + title -> same key, so reruns do not duplicate posts
+    key = hashlib.sha256(json.dumps([row["artist"], image_urls, row["title"]]).encode("utf-8")).hexdigest()
+    return key, row, image_urls
+
+
+def generate(row, image_urls):
+    image_paths = [uploads.url_to_path(url) for url in image_urls]
+    story, purpose, _ = ai_provider.generate_batched(image_paths, row["idea_text"])
+    return story or row["idea_text"], purpose
+
+
+def run(args):
+    app.init_db()
+    app.ensure_schema()
+    ensure_import_log()
+    entries = read_manifest(args.manifest)
+    total = len(entries)
+    imported = skipped = failed = 0
+    started = time.perf_counter()
+    io_pool = ThreadPoolExecutor(max_workers=args.io_workers)
+    ai_pool = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        for offset in range(0, total, args.batch_size):
+            chunk = entries[offset:offset + args.batch_size]
+            prepared = []
+            for entry, future in [(e, io_pool.submit(prepare, args.image_dir, e, args.artist)) for e in chunk]:
+                try:
+                    prepared.append(future.result())
+                except OSError as e:
+                    failed += 1
+                    print(f"Skipping {entry.get('image')!r}: {e}")
+
+            done = already_imported([key for key, _, _ in prepared])
+            todo = []
+            for p in prepared:
+                if p[0] not in done:
+                    done.add(p[0])  # also drops duplicate rows within the manifest
+                    todo.append(p)
+            skipped += len(prepared) - len(todo)
+
+            stories = list(ai_pool.map(lambda p: generate(p[1], p[2]), todo))
+            rows = []
+            for (key, row, image_urls), (story, purpose) in zip(todo, stories):
+                post_row = {
+                    "image_path": image_urls[0] if image_urls else None,
+                    "title": row["title"],
+                    "idea_text": row["idea_text"],
+                    "story": story,
+                    "purpose": purpose,
+                    "artist": row["artist"],
+                    "price": row["price"],
+                    "contact": row["contact"],
+                    "category": row["category"],
+                    "images": image_urls,
+                }
+                rows.append(post_row)
+            keys = iter([key for key, _, _ in todo])  # rows are inserted in order
+
+            def log_import(c, post_id, post_row):
+                c.execute("INSERT INTO import_log (key, post_id) VALUES (?, ?)", (next(keys), post_id))
+
+            post_ids = app.insert_posts(rows, on_inserted=log_import)
+            for post_id, post_row in zip(post_ids, rows):
+                similarity.index_post(post_id, uploads.url_to_path(post_row["image_path"]))
+            imported += len(post_ids)
+
+            elapsed = time.perf_counter() - started
+            print(f"[{min(offset + len(chunk), total)}/{total}] imported={imported} skipped={skipped} "
+                  f"failed={failed} {imported / elapsed if elapsed else 0:.2f} posts/s")
+    finally:
+        io_pool.shutdown()
+        ai_pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    print(f"Done in {elapsed:.1f}s: {imported} imported, {skipped} already present, {failed} failed "
+          f"({imported / elapsed if elapsed else 0:.2f} posts/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import artwork images with a CSV/JSONL manifest.")
+    parser.add_argument("image_dir")
+    parser.add_argument("manifest")
+    parser.add_argument("--artist", required=True, help="artist username for rows without an artist column")
+    parser.add_argument("--workers", type=int, default=ai_provider.AI_BATCH_SIZE * ai_provider.AI_BATCH_CONCURRENCY,
+                        help="concurrent story generations (default: AI_BATCH_SIZE * AI_BATCH_CONCURRENCY, "
+                             "enough to keep every batch slot full)")
+    parser.add_argument("--io-workers", type=int, default=8, help="concurrent image hash/copy jobs")
+    parser.add_argument("--batch-size", type=int, default=200, help="posts per insert transaction")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# metrics.py
+# Minimal in-process metrics with Prometheus text exposition (no external deps)
+#
+# With several worker processes (gunicorn -w N) each process only sees its own numbers. Set
+# METRICS_MULTIPROC_DIR to a directory shared by the workers (emptied on every deploy): each
+# worker writes a snapshot of its values there every METRICS_FLUSH_INTERVAL seconds (and on
+# exit), and /metrics merges all snapshots, so whichever worker answers a scrape reports the
+# whole app. Counters and histograms are summed, including workers that have exited; gauges
+# only count live workers and are summed or maxed per gauge. Other workers' numbers can lag by
+# up to METRICS_FLUSH_INTERVAL.
+import os
+import glob
+import json
+import time
+import atexit
+import threading
+
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5") or 5)
+
+_lock = threading.Lock()
+REGISTRY = []
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        with _lock:
+            REGISTRY.append(self)
+
+    def snapshot(self):
+        with _lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, values, snapshot, live: bool):
+        """Add one worker's snapshot into values ({label key: value})."""
+        for key, value in snapshot:
+            key = tuple(key)
+            values[key] = values.get(key, 0) + value
+
+    def render(self, values=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if values is None:
+            with _lock:
+                values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), multiprocess_mode: str = "sum"):
+        super().__init__(name, help_text, labelnames)
+        self.multiprocess_mode = multiprocess_mode  # "sum" or "max" across live workers
+
+    def merge(self, values, snapshot, live: bool):
+        if not live:
+            return
+        for key, value in snapshot:
+            key = tuple(key)
+            if self.multiprocess_mode == "max":
+                values[key] = max(values.get(key, value), value)
+            else:
+                values[key] = values.get(key, 0) + value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = value
+
+    def total(self) -> float:
+        with _lock:
+            return sum(self._values.values())
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def snapshot(self):
+        with _lock:
+            return [[list(k), {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]}]
+                    for k, v in self._values.items()]
+
+    def merge(self, values, snapshot, live: bool):
+        for key, state in snapshot:
+            if len(state["counts"]) != len(self.buckets):
+                continue  # written by a build with different buckets
+            total = values.setdefault(tuple(key), {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            total["counts"] = [a + b for a, b in zip(total["counts"], state["counts"])]
+            total["sum"] += state["sum"]
+            total["count"] += state["count"]
+
+    def render(self, values=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if values is None:
+            values = {tuple(k): v for k, v in self.snapshot()}
+        items = sorted(values.items())
+        for key, state in items:
+            for bound, count in zip(self.buckets, state["counts"]):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', str(bound)))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {state['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state['count']}")
+        return lines
+
+
+def render() -> str:
+    with _lock:
+        metrics = list(REGISTRY)
+    merged = _merge_workers(metrics) if METRICS_MULTIPROC_DIR else {}
+    lines = []
+    for m in metrics:
+        lines.extend(m.render(merged.get(m.name)))
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------
+# Multi-process aggregation (METRICS_MULTIPROC_DIR)
+# ----------------------
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_MULTIPROC_DIR, f"metrics-{pid}.json")
+
+
+def write_snapshot():
+    """Write this process's values to its file in METRICS_MULTIPROC_DIR."""
+    with _lock:
+        metrics = list(REGISTRY)
+    data = {m.name: m.snapshot() for m in metrics}
+    path = _snapshot_path(os.getpid())
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge_workers(metrics):
+    write_snapshot()  # this worker's numbers are current; the others' are up to one flush old
+    by_name = {m.name: m for m in metrics}
+    merged = {m.name: {} for m in metrics}
+    for path in glob.glob(os.path.join(METRICS_MULTIPROC_DIR, "metrics-*.json")):
+        try:
+            pid = int(os.path.basename(path)[len("metrics-"):-len(".json")])
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        live = pid == os.getpid() or _pid_alive(pid)
+        for name, snapshot in data.items():
+            metric = by_name.get(name)
+            if metric is not None:
+                metric.merge(merged[name], snapshot, live)
+    return merged
+
+
+def start_multiprocess_writer(interval: float = METRICS_FLUSH_INTERVAL):
+    """Periodically publish this worker's values for the other workers' /metrics. No-op unless
+    METRICS_MULTIPROC_DIR is set."""
+    if not METRICS_MULTIPROC_DIR:
+        return None
+    os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+
+    def flush():
+        try:
+            write_snapshot()
+        except OSError as e:
+            print("Metrics snapshot failed:", e)
+
+    def run():
+        while True:
+            flush()
+            time.sleep(interval)
+
+    atexit.register(flush)
+    thread = threading.Thread(target=run, name="metrics-writer", daemon=True)
+    thread.start()
+    return thread
+
+
+# ----------------------
+# App metrics
+# ----------------------
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method", "route"))
+
+DB_QUERIES = Counter("db_queries_total", "SQLite statements executed", ("kind",))
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQLite statement latency", ("kind",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+
+PROVIDER_REQUEST_DURATION = Histogram(
+    "ai_provider_request_duration_seconds", "Latency of external AI provider calls", ("provider", "operation"))
+PROVIDER_ERRORS = Counter(
+    "ai_provider_errors_total", "Failed external AI provider calls", ("provider", "operation"))
+LOCAL_FALLBACKS = Counter("ai_local_fallback_total", "Stories generated by the local fallback")
+PROVIDER_BREAKER_STATE = Gauge(
+    "ai_provider_breaker_state", "Circuit breaker state per provider (0 closed, 1 half-open, 2 open)", ("provider",),
+    multiprocess_mode="max")
+PROVIDER_REJECTED = Counter(
+    "ai_provider_rejected_total", "Calls skipped because the provider's circuit breaker was open", ("provider",))
+PROVIDER_HEDGED = Counter(
+    "ai_provider_hedged_total", "Remote calls abandoned for the local fallback after AI_HEDGE_AFTER", ("provider",))
@@ -0,0 +1,68 @@
+# page_cache.py
+# In-process cache for rendered, user-independent page fragments.
+#
+# Entries record the versions of the entities they were built from, e.g.
+# ("post", 12) or ("artist", "sohan"). Writers bump those versions (insert_post,
+# likes, story updates, profile edits) and stale entries are simply never served again.
+import os
+import threading
+from collections import OrderedDict
+
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "512") or 512)
+
+_lock = threading.Lock()
+_versions = {}
+_entries = OrderedDict()
+
+
+def _norm(kind, ident):
+    return (kind, ident.strip().lower() if isinstance(ident, str) else ident)
+
+
+def version(kind, ident) -> int:
+    with _lock:
+        return _versions.get(_norm(kind, ident), 0)
+
+
+def bump(kind, ident):
+    """Invalidate every cached entry that depends on (kind, ident)."""
+    dep = _norm(kind, ident)
+    with _lock:
+        _versions[dep] = _versions.get(dep, 0) + 1
+
+
+def get(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        value, deps = entry
+        if any(_versions.get(dep, 0) != v for dep, v in deps):
+            del _entries[key]
+            return None
+        _entries.move_to_end(key)
+        return value
+
+
+def put(key, value, deps, versions=None):
+    """Store value under key. versions: {dep: version} read *before* value was built."""
+    deps = [_norm(kind, ident) for kind, ident in deps]
+    with _lock:
+        if versions is None:
+            versions = {}
+        recorded = tuple((dep, versions.get(dep, _versions.get(dep, 0))) for dep in deps)
+        _entries[key] = (value, recorded)
+        _entries.move_to_end(key)
+        while len(_entries) > PAGE_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def snapshot(deps):
+    """Current versions of deps; pass to put() so writes racing with a rebuild are not lost."""
+    with _lock:
+        return {_norm(kind, ident): _versions.get(_norm(kind, ident), 0) for kind, ident in deps}
+
+
+def clear():
+    with _lock:
+        _entries.clear()
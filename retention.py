@@ -0,0 +1,187 @@
+# retention.py
+# Hot/cold storage for chat messages and scheduled database maintenance.
+#
+# Messages older than MESSAGE_HOT_DAYS are moved from artfeed.db into an attached archive
+# database (MESSAGE_ARCHIVE_PATH); the chat history API reads both. A background scheduler
+# runs the archival plus ANALYZE / PRAGMA optimize, an incremental vacuum and (in WAL mode)
+# a checkpoint once per MAINTENANCE_INTERVAL, waiting for a moment with little traffic.
+# Only one worker runs each pass (claimed through maintenance_state).
+#
+# Incremental vacuum needs auto_vacuum=INCREMENTAL, which only takes effect after a full
+# VACUUM that rewrites and locks the whole file. That switch is an explicit admin step
+# (enable_incremental_vacuum, /admin/maintenance/vacuum); scheduled passes never run it.
+import os
+import time
+import datetime
+import threading
+
+import metrics
+from db import DB_PATH, get_conn
+
+MESSAGE_HOT_DAYS = int(os.getenv("MESSAGE_HOT_DAYS", "90") or 90)
+MESSAGE_ARCHIVE_PATH = os.getenv("MESSAGE_ARCHIVE_PATH") or os.path.join(os.path.dirname(DB_PATH), "artfeed_archive.db")
+ARCHIVE_BATCH = 5000
+
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "86400") or 86400)
+MAINTENANCE_CHECK_INTERVAL = float(os.getenv("MAINTENANCE_CHECK_INTERVAL", "300") or 300)
+# Run only while at most this many requests are in flight in this worker
+MAINTENANCE_MAX_IN_FLIGHT = int(os.getenv("MAINTENANCE_MAX_IN_FLIGHT", "0") or 0)
+# Optional UTC hour (0-23) the pass is restricted to, e.g. 4 for the nightly lull
+MAINTENANCE_HOUR = os.getenv("MAINTENANCE_HOUR", "")
+# Pages released per incremental vacuum (0 = all free pages)
+VACUUM_PAGES = int(os.getenv("MAINTENANCE_VACUUM_PAGES", "0") or 0)
+
+_MESSAGE_COLUMNS = "id, sender, receiver, content, created_at"
+
+
+def ensure_tables(c):
+    # Chat lookups filter on LOWER(sender)/LOWER(receiver); archival scans by age
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_pair ON messages(LOWER(sender), LOWER(receiver), created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages(created_at)")
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_state (
+            task TEXT PRIMARY KEY,
+            last_run REAL NOT NULL DEFAULT 0
+        )
+        """
+    )
+
+
+# ----------------------
+# Archive database
+# ----------------------
+def attach_archive(conn, create: bool = False) -> bool:
+    """ATTACH the archive as "archive" on conn. Returns False when there is no archive yet."""
+    if not create and not os.path.exists(MESSAGE_ARCHIVE_PATH):
+        return False
+    c = conn.cursor()
+    c.execute("ATTACH DATABASE ? AS archive", (MESSAGE_ARCHIVE_PATH,))
+    if create:
+        c.execute(
+            """
+            CREATE TABLE IF NOT EXISTS archive.messages (
+                id INTEGER PRIMARY KEY,
+                sender TEXT NOT NULL,
+                receiver TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at TIMESTAMP
+            )
+            """
+        )
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS archive.idx_messages_pair "
+            "ON messages(LOWER(sender), LOWER(receiver), created_at)"
+        )
+    return True
+
+
+def archive_messages(days: int = MESSAGE_HOT_DAYS) -> int:
+    """Move messages older than `days` into the archive, ARCHIVE_BATCH rows per transaction."""
+    conn = get_conn()
+    attach_archive(conn, create=True)
+    c = conn.cursor()
+    moved = 0
+    while True:
+        c.execute(
+            "SELECT id FROM main.messages WHERE created_at < datetime('now', ?) ORDER BY created_at LIMIT ?",
+            (f"-{days} days", ARCHIVE_BATCH),
+        )
+        ids = [r[0] for r in c.fetchall()]
+        if not ids:
+            break
+        placeholders = ",".join(["?"] * len(ids))
+        # OR IGNORE: a batch interrupted between the two statements is simply moved again
+        c.execute(
+            f"INSERT OR IGNORE INTO archive.messages ({_MESSAGE_COLUMNS}) "
+            f"SELECT {_MESSAGE_COLUMNS} FROM main.messages WHERE id IN ({placeholders})",
+            ids,
+        )
+        c.execute(f"DELETE FROM main.messages WHERE id IN ({placeholders})", ids)
+        conn.commit()
+        moved += len(ids)
+    conn.close()
+    return moved
+
+
+# ----------------------
+# Maintenance
+# ----------------------
+def run_maintenance() -> dict:
+    started = time.perf_counter()
+    result = {"archived_messages": archive_messages()}
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("PRAGMA auto_vacuum")
+    if c.fetchone()[0] != 2:
+        result["vacuum"] = "disabled"  # see enable_incremental_vacuum()
+    else:
+        c.execute("PRAGMA freelist_count")
+        free_pages = c.fetchone()[0]
+        c.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+        c.fetchall()
+        result["vacuum"] = "incremental"
+        result["freed_pages"] = min(free_pages, VACUUM_PAGES) if VACUUM_PAGES else free_pages
+    c.execute("ANALYZE")
+    c.execute("PRAGMA optimize")
+    c.execute("PRAGMA journal_mode")
+    if c.fetchone()[0] == "wal":
+        c.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        c.fetchall()
+        result["checkpoint"] = True
+    conn.commit()
+    conn.close()
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def enable_incremental_vacuum() -> dict:
+    """One-time switch to auto_vacuum=INCREMENTAL. Runs a full VACUUM: schedule it for downtime."""
+    started = time.perf_counter()
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("PRAGMA auto_vacuum")
+    if c.fetchone()[0] == 2:
+        conn.close()
+        return {"vacuum": "already incremental"}
+    c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    c.execute("VACUUM")
+    conn.close()
+    return {"vacuum": "full", "seconds": round(time.perf_counter() - started, 3)}
+
+
+def claim(task, interval) -> bool:
+    """Mark a background task as started if it is due; False if another worker got it."""
+    now = time.time()
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("INSERT OR IGNORE INTO maintenance_state (task, last_run) VALUES (?, 0)", (task,))
+    c.execute(
+        "UPDATE maintenance_state SET last_run=? WHERE task=? AND last_run <= ?",
+        (now, task, now - interval),
+    )
+    claimed = c.rowcount == 1
+    conn.commit()
+    conn.close()
+    return claimed
+
+
+def _is_quiet() -> bool:
+    if MAINTENANCE_HOUR and datetime.datetime.now(datetime.timezone.utc).hour != int(MAINTENANCE_HOUR):
+        return False
+    return metrics.HTTP_REQUESTS_IN_FLIGHT.total() <= MAINTENANCE_MAX_IN_FLIGHT
+
+
+def start_maintenance_thread(interval: float = MAINTENANCE_INTERVAL):
+    def run():
+        while True:
+            time.sleep(MAINTENANCE_CHECK_INTERVAL)
+            try:
+                if _is_quiet() and claim("maintenance", interval):
+                    print("Database maintenance:", run_maintenance())
+            except Exception as e:
+                print("Database maintenance failed:", e)
+
+    thread = threading.Thread(target=run, name="db-maintenance", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,293 @@
+# similarity.py
+# "More like this": compact visual features per post and an in-memory k-NN index.
+#
+# Each image is described by a 64-bit perceptual hash (DCT of a 32x32 grayscale thumbnail)
+# and a 64-bin RGB color histogram. Features are persisted in image_features so every
+# worker can load them; queries run vectorized over NumPy arrays.
+import sqlite3
+import threading
+import time
+
+import cache_sync
+from db import get_conn
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:  # optional: related posts are simply empty without numpy/Pillow
+    np = None
+    Image = None
+
+HASH_BITS = 64
+HIST_BINS = 64
+# Weight of the perceptual-hash distance vs. the color-histogram distance (both in [0, 1])
+HASH_WEIGHT = 0.5
+# backfill(): attempts per post while the database is locked, doubling the wait from this many seconds
+BACKFILL_BUSY_RETRIES = 5
+BACKFILL_BUSY_BACKOFF = 0.5
+
+_backfill_lock = threading.Lock()
+
+
+def ensure_tables(c):
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS image_features (
+            post_id INTEGER PRIMARY KEY,
+            phash BLOB NOT NULL,
+            hist BLOB NOT NULL
+        )
+        """
+    )
+
+
+# ----------------------
+# Feature extraction
+# ----------------------
+_dct_matrix = None
+
+
+def _dct(n=32):
+    global _dct_matrix
+    if _dct_matrix is None:
+        k = np.arange(n)[:, None]
+        i = np.arange(n)[None, :]
+        m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        m[0] /= np.sqrt(2.0)
+        _dct_matrix = m.astype(np.float32)
+    return _dct_matrix
+
+
+def compute_features(image_path: str):
+    """Return (phash_bits uint8[64], hist float32[64]) or None if the image cannot be read."""
+    if np is None or not image_path:
+        return None
+    try:
+        with Image.open(image_path) as img:
+            img = img.convert("RGB")
+            gray = np.asarray(img.convert("L").resize((32, 32), Image.BILINEAR), dtype=np.float32)
+            rgb = np.asarray(img.resize((64, 64), Image.BILINEAR), dtype=np.uint8)
+    except Exception as e:
+        print("Feature extraction failed:", e)
+        return None
+
+    c = _dct()
+    low = (c @ gray @ c.T)[:8, :8].ravel()
+    bits = (low > np.median(low[1:])).astype(np.uint8)
+
+    q = (rgb >> 6).reshape(-1, 3).astype(np.int64)  # 4 levels per channel
+    hist = np.bincount(q[:, 0] * 16 + q[:, 1] * 4 + q[:, 2], minlength=HIST_BINS).astype(np.float32)
+    hist /= hist.sum() or 1.0
+    return bits, hist
+
+
+# ----------------------
+# In-memory index
+# ----------------------
+class SimilarityIndex:
+    """Array-backed index with O(1) add/remove and vectorized k-nearest-neighbour queries."""
+
+    def __init__(self, capacity: int = 256):
+        self._lock = threading.Lock()
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._bits = np.zeros((capacity, HASH_BITS), dtype=np.uint8)
+        self._hist = np.zeros((capacity, HIST_BINS), dtype=np.float32)
+        self._pos = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, post_id):
+        return post_id in self._pos
+
+    def _grow(self):
+        cap = len(self._ids) * 2
+        self._ids = np.resize(self._ids, cap)
+        self._bits = np.resize(self._bits, (cap, HASH_BITS))
+        self._hist = np.resize(self._hist, (cap, HIST_BINS))
+
+    def add(self, post_id: int, bits, hist):
+        with self._lock:
+            row = self._pos.get(post_id)
+            if row is None:
+                if self._size == len(self._ids):
+                    self._grow()
+                row = self._size
+                self._size += 1
+                self._pos[post_id] = row
+                self._ids[row] = post_id
+            self._bits[row] = bits
+            self._hist[row] = hist
+
+    def remove(self, post_id: int):
+        with self._lock:
+            row = self._pos.pop(post_id, None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                # Move the last row into the hole
+                moved = int(self._ids[last])
+                self._ids[row] = moved
+                self._bits[row] = self._bits[last]
+                self._hist[row] = self._hist[last]
+                self._pos[moved] = row
+            self._size = last
+
+    def query(self, bits, hist, k: int = 6, exclude: int | None = None):
+        """Return [(post_id, distance)] for the k closest images, distance in [0, 1]."""
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return []
+            hamming = (self._bits[:n] != bits).sum(axis=1) / HASH_BITS
+            color = np.abs(self._hist[:n] - hist).sum(axis=1) / 2
+            dist = HASH_WEIGHT * hamming + (1 - HASH_WEIGHT) * color
+            ids = self._ids[:n].copy()
+        if exclude is not None and exclude in self._pos:
+            dist[ids == exclude] = np.inf
+        k = min(k, n)
+        top = np.argpartition(dist, k - 1)[:k]
+        top = top[np.argsort(dist[top])]
+        return [(int(ids[i]), float(dist[i])) for i in top if np.isfinite(dist[i])]
+
+    def vector(self, post_id: int):
+        with self._lock:
+            row = self._pos.get(post_id)
+            if row is None:
+                return None
+            return self._bits[row].copy(), self._hist[row].copy()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if np is None:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = SimilarityIndex()
+        return _index
+
+
+# ----------------------
+# Persistence
+# ----------------------
+def index_post(post_id: int, image_path: str):
+    """Compute, store and index the features of a post's primary image."""
+    features = compute_features(image_path)
+    if features is None:
+        return False
+    bits, hist = features
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute(
+        "INSERT OR REPLACE INTO image_features (post_id, phash, hist) VALUES (?, ?, ?)",
+        (post_id, np.packbits(bits).tobytes(), hist.tobytes()),
+    )
+    conn.commit()
+    conn.close()
+    get_index().add(post_id, bits, hist)
+    cache_sync.publish([("features", post_id)])
+    return True
+
+
+def _load_row(index, post_id, phash, hist):
+    bits = np.unpackbits(np.frombuffer(phash, dtype=np.uint8))[:HASH_BITS]
+    index.add(post_id, bits, np.frombuffer(hist, dtype=np.float32))
+
+
+def load_index():
+    """Load all stored features into this process's index."""
+    index = get_index()
+    if index is None:
+        return 0
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("SELECT post_id, phash, hist FROM image_features")
+    for post_id, phash, hist in c:
+        _load_row(index, post_id, phash, hist)
+    conn.close()
+    return len(index)
+
+
+def load_post(post_id: int) -> bool:
+    """Pick up features another worker stored for post_id."""
+    index = get_index()
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("SELECT phash, hist FROM image_features WHERE post_id=?", (post_id,))
+    row = c.fetchone()
+    conn.close()
+    if not row:
+        return False
+    _load_row(index, post_id, row[0], row[1])
+    return True
+
+
+def _index_post_retrying(post_id: int, image_path: str):
+    """index_post, backing off while another writer holds the database."""
+    for attempt in range(BACKFILL_BUSY_RETRIES + 1):
+        try:
+            return index_post(post_id, image_path)
+        except sqlite3.OperationalError as e:
+            if attempt == BACKFILL_BUSY_RETRIES or "locked" not in str(e):
+                raise
+            time.sleep(BACKFILL_BUSY_BACKOFF * 2 ** attempt)
+
+
+def backfill(url_to_path):
+    """Compute features for posts that have an image but no stored features.
+
+    One post failing (unreadable file, database still busy after the retries) is logged and
+    skipped. Returns the number of posts indexed; a second call while one is running is a no-op.
+    """
+    if np is None or not _backfill_lock.acquire(blocking=False):
+        return 0
+    try:
+        conn = get_conn()
+        c = conn.cursor()
+        c.execute(
+            """
+            SELECT p.id, p.image_path FROM posts p
+            LEFT JOIN image_features f ON f.post_id = p.id
+            WHERE f.post_id IS NULL AND p.image_path IS NOT NULL AND p.image_path != ''
+            """
+        )
+        rows = c.fetchall()
+        conn.close()
+        indexed = 0
+        for post_id, url in rows:
+            try:
+                indexed += bool(_index_post_retrying(post_id, url_to_path(url)))
+            except Exception as e:
+                print(f"Similarity backfill skipped post {post_id}:", e)
+        return indexed
+    finally:
+        _backfill_lock.release()
+
+
+def related(post_id: int, k: int = 6):
+    """Post ids visually closest to post_id, nearest first."""
+    index = get_index()
+    if index is None:
+        return []
+    if post_id not in index and not load_post(post_id):
+        return []
+    bits, hist = index.vector(post_id)
+    return [pid for pid, _ in index.query(bits, hist, k=k, exclude=post_id)]
+
+
+def remove_post(post_id: int):
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("DELETE FROM image_features WHERE post_id=?", (post_id,))
+    conn.commit()
+    conn.close()
+    index = get_index()
+    if index is not None:
+        index.remove(post_id)
@@ -1,7 +1,13 @@
 let allPosts = [];
 let showingFollowing = false;
+let showingTrending = false;
 let currentCategory = "";
-let likedIds = new Set(); // post IDs liked by current user
+// "All" is paged: the server renders the first page, later pages continue from nextCursor
+let feedPageSize = 24;
+let nextCursor = null;
+let loadingMore = false;
+// Search runs on the server over the whole feed, not just the pages loaded so far
+let searchQuery = "";
 
 async function loadFeed() {
   let url = "/feed_api";
@@ -10,10 +16,25 @@ async function loadFeed() {
   if (showingFollowing) {
     params.append("following", "1");
   }
+
+  if (showingTrending) {
+    params.append("sort", "trending");
+  }
   
   if (currentCategory && currentCategory !== "") {
     params.append("category", currentCategory);
   }
+
+  const query = searchQuery;
+  if (query) {
+    params.append("q", query);
+  }
+
+  const paged = !showingFollowing && !showingTrending && !currentCategory;
+  if (paged) {
+    params.append("limit", String(feedPageSize));
+  }
+  nextCursor = null;
   
   if (params.toString()) {
     url += "?" + params.toString();
@@ -28,6 +49,7 @@ async function loadFeed() {
       if (res.status === 401) {
         showNotice('Please log in and follow artists to use Followers Only.');
         showingFollowing = false;
+        showingTrending = false;
         currentCategory = "";
         updateFilterStyles();
         // Load all posts instead of recursive call
@@ -39,6 +61,7 @@ async function loadFeed() {
       }
       showNotice('Failed to load feed. Showing All.');
       showingFollowing = false;
+      showingTrending = false;
       currentCategory = "";
       updateFilterStyles();
       const resAll = await fetch('/feed_api');
@@ -49,9 +72,13 @@ async function loadFeed() {
     }
     
     const data = await res.json();
+    if (query !== searchQuery) return; // a newer search superseded this response
     console.log('Received data:', data);
     allPosts = Array.isArray(data) ? data : [];
     console.log('Processed posts:', allPosts.length);
+    if (paged && allPosts.length === feedPageSize) {
+      nextCursor = allPosts[allPosts.length - 1].id;
+    }
     renderFeed(allPosts);
     // After rendering, wire up like buttons
     attachLikeHandlers();
@@ -86,8 +113,13 @@ function renderFeed(posts) {
     return;
   }
   
-  container.innerHTML = posts.map(p => {
-    const liked = likedIds.has(p.id);
+  container.innerHTML = posts.map(cardHtml).join("");
+  console.log('Feed rendered successfully');
+}
+
+// Keep in sync with templates/fragments/feed_cards.html (server-rendered first page)
+function cardHtml(p) {
+    const liked = !!p.liked_by_me;
     const heart = liked ? '❤' : '♡';
     const heartTitle = liked ? 'Unlike' : 'Like';
     return `
@@ -118,8 +150,57 @@ function renderFeed(posts) {
           </div>` : ""}
       </div>
     </a>`;
-  }).join("");
-  console.log('Feed rendered successfully');
+}
+
+// ----- Server-rendered first page and further pages -----
+function hydrateFeed() {
+  const container = document.getElementById("feed");
+  const dataEl = document.getElementById("feedData");
+  if (!container || !dataEl) return false;
+  try {
+    const data = JSON.parse(dataEl.textContent);
+    allPosts = Array.isArray(data) ? data : [];
+  } catch (e) {
+    return false;
+  }
+  feedPageSize = parseInt(container.dataset.pageSize, 10) || feedPageSize;
+  nextCursor = container.dataset.nextCursor ? parseInt(container.dataset.nextCursor, 10) : null;
+  attachLikeHandlers(container);
+  return true;
+}
+
+async function loadMore() {
+  if (!nextCursor || loadingMore) return;
+  loadingMore = true;
+  const query = searchQuery;
+  try {
+    const params = new URLSearchParams({ before: String(nextCursor), limit: String(feedPageSize) });
+    if (query) params.append("q", query);
+    const res = await fetch(`/feed_api?${params.toString()}`);
+    const page = res.ok ? await res.json() : [];
+    // a filter was picked or the search changed while this page was loading
+    if (!nextCursor || query !== searchQuery) return;
+    const posts = Array.isArray(page) ? page : [];
+    nextCursor = posts.length === feedPageSize ? posts[posts.length - 1].id : null;
+    allPosts = allPosts.concat(posts);
+    const holder = document.createElement("div");
+    holder.innerHTML = posts.map(cardHtml).join("");
+    attachLikeHandlers(holder);
+    const container = document.getElementById("feed");
+    while (holder.firstChild) container.appendChild(holder.firstChild);
+  } catch (err) {
+    console.error('Error loading more posts:', err);
+  } finally {
+    loadingMore = false;
+  }
+}
+
+function setupInfiniteScroll() {
+  const sentinel = document.getElementById("feedMore");
+  if (!sentinel || !('IntersectionObserver' in window)) return;
+  new IntersectionObserver(entries => {
+    if (entries.some(e => e.isIntersecting)) loadMore();
+  }, { rootMargin: "600px" }).observe(sentinel);
 }
 
 
@@ -137,21 +218,22 @@ function escapeHtml(str) {
 function setupSearch() {
   const input = document.getElementById("searchInput");
   if (!input) return;
+  let timer = null;
   input.addEventListener("input", () => {
-    const q = input.value.toLowerCase();
-    const filtered = allPosts.filter(p =>
-      (p.title || "").toLowerCase().includes(q) ||
-      (p.artist || "").toLowerCase().includes(q) ||
-      (p.category || "").toLowerCase().includes(q) ||
-      (p.created_at || "").toLowerCase().includes(q)
-    );
-    renderFeed(filtered);
+    clearTimeout(timer);
+    timer = setTimeout(async () => {
+      const q = input.value.trim();
+      if (q === searchQuery) return;
+      searchQuery = q;
+      await loadFeed();
+    }, 250);
   });
 }
 
 function setupFilters() {
   const btnAll = document.getElementById('filterAll');
   const btnFollowing = document.getElementById('filterFollowing');
+  const btnTrending = document.getElementById('filterTrending');
   const btnPaintings = document.getElementById('filterPaintings');
   const btnVases = document.getElementById('filterVases');
   const btnArt = document.getElementById('filterArt');
@@ -160,6 +242,7 @@ function setupFilters() {
   if (btnAll) {
     btnAll.addEventListener('click', async () => {
       showingFollowing = false;
+      showingTrending = false;
       currentCategory = "";
       updateFilterStyles();
       await loadFeed();
@@ -168,6 +251,16 @@ function setupFilters() {
   if (btnFollowing) {
     btnFollowing.addEventListener('click', async () => {
       showingFollowing = true;
+      showingTrending = false;
+      currentCategory = "";
+      updateFilterStyles();
+      await loadFeed();
+    });
+  }
+  if (btnTrending) {
+    btnTrending.addEventListener('click', async () => {
+      showingFollowing = false;
+      showingTrending = true;
       currentCategory = "";
       updateFilterStyles();
       await loadFeed();
@@ -176,6 +269,7 @@ function setupFilters() {
   if (btnPaintings) {
     btnPaintings.addEventListener('click', async () => {
       showingFollowing = false;
+      showingTrending = false;
       currentCategory = "Paintings";
       updateFilterStyles();
       await loadFeed();
@@ -184,6 +278,7 @@ function setupFilters() {
   if (btnVases) {
     btnVases.addEventListener('click', async () => {
       showingFollowing = false;
+      showingTrending = false;
       currentCategory = "Vases";
       updateFilterStyles();
       await loadFeed();
@@ -192,6 +287,7 @@ function setupFilters() {
   if (btnArt) {
     btnArt.addEventListener('click', async () => {
       showingFollowing = false;
+      showingTrending = false;
       currentCategory = "Art";
       updateFilterStyles();
       await loadFeed();
@@ -200,6 +296,7 @@ function setupFilters() {
   if (btnCups) {
     btnCups.addEventListener('click', async () => {
       showingFollowing = false;
+      showingTrending = false;
       currentCategory = "Cups";
       updateFilterStyles();
       await loadFeed();
@@ -210,19 +307,22 @@ function setupFilters() {
 function updateFilterStyles() {
   const btnAll = document.getElementById('filterAll');
   const btnFollowing = document.getElementById('filterFollowing');
+  const btnTrending = document.getElementById('filterTrending');
   const btnPaintings = document.getElementById('filterPaintings');
   const btnVases = document.getElementById('filterVases');
   const btnArt = document.getElementById('filterArt');
   const btnCups = document.getElementById('filterCups');
   
   // Remove active class from all buttons
-  [btnAll, btnFollowing, btnPaintings, btnVases, btnArt, btnCups].forEach(btn => {
+  [btnAll, btnFollowing, btnTrending, btnPaintings, btnVases, btnArt, btnCups].forEach(btn => {
     if (btn) btn.classList.remove('active');
   });
   
   // Add active class to the appropriate button
   if (showingFollowing) {
     if (btnFollowing) btnFollowing.classList.add('active');
+  } else if (showingTrending) {
+    if (btnTrending) btnTrending.classList.add('active');
   } else if (currentCategory === "Paintings") {
     if (btnPaintings) btnPaintings.classList.add('active');
   } else if (currentCategory === "Vases") {
@@ -237,30 +337,16 @@ function updateFilterStyles() {
 }
 
 // ----- Likes helpers -----
-async function loadLikedIds() {
-  try {
-    const res = await fetch('/api/my_liked_ids');
-    if (!res.ok) {
-      likedIds = new Set();
-      return;
-    }
-    const ids = await res.json();
-    if (Array.isArray(ids)) {
-      likedIds = new Set(ids);
-    }
-  } catch (e) {
-    likedIds = new Set();
-  }
-}
-
-function attachLikeHandlers() {
-  const buttons = document.querySelectorAll('.like-btn');
+// Each post from /feed_api carries liked_by_me for the current user
+function attachLikeHandlers(root) {
+  const buttons = (root || document).querySelectorAll('.like-btn');
   buttons.forEach(btn => {
     btn.addEventListener('click', async (e) => {
       e.preventDefault();
       e.stopPropagation();
       const postId = parseInt(btn.getAttribute('data-post-id'), 10);
-      const isLiked = likedIds.has(postId);
+      const post = allPosts.find(p => p.id === postId);
+      const isLiked = !!(post && post.liked_by_me);
       try {
         const url = isLiked ? '/api/unlike' : '/api/like';
         const res = await fetch(url, {
@@ -274,13 +360,9 @@ function attachLikeHandlers() {
         }
         const data = await res.json();
         if (data && data.status === 'ok') {
-          if (isLiked) {
-            likedIds.delete(postId);
-          } else {
-            likedIds.add(postId);
-          }
+          const nowLiked = !isLiked;
+          if (post) post.liked_by_me = nowLiked;
           // Update button UI without re-rendering entire feed
-          const nowLiked = likedIds.has(postId);
           btn.textContent = nowLiked ? '❤' : '♡';
           btn.style.color = nowLiked ? '#e11d48' : '#6b7280';
           btn.title = nowLiked ? 'Unlike' : 'Like';
@@ -302,8 +384,8 @@ function attachLikeHandlers() {
 
 // Initial load with retry mechanism
 async function initializeFeed() {
+  if (hydrateFeed()) return;
   try {
-    await loadLikedIds();
     await loadFeed();
   } catch (err) {
     console.error('Initial feed load failed:', err);
@@ -324,6 +406,7 @@ async function initializeFeed() {
 }
 
 initializeFeed();
+setupInfiniteScroll();
 setupSearch();
 setupFilters();
 updateFilterStyles();
@@ -0,0 +1,254 @@
+# ai_provider: batched story generation (parsing, per-item fallbacks, batching) and streamed generation.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import ai_provider
+
+
+def _answer(n, text=None):
+    return f"<<<ITEM {n}>>>\n{text or f'story {n}---purpose {n}---artist {n}'}\n<<<END {n}>>>"
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Route Gemini calls to a fake; set calls.reply to the text (or callable) it should return."""
+    class Calls(list):
+        reply = None
+
+    calls = Calls()
+
+    def fake_call(prompt):
+        calls.append(prompt)
+        return calls.reply(prompt) if callable(calls.reply) else calls.reply
+
+    monkeypatch.setattr(ai_provider, "AI_PROVIDER", "gemini")
+    monkeypatch.setattr(ai_provider, "AI_HEDGE_AFTER", 0)
+    monkeypatch.setattr(ai_provider, "call_gemini", fake_call)
+    return calls
+
+
+# ----------------------
+# parse_batch_output
+# ----------------------
+def test_parse_batch_output_maps_items_by_number():
+    out = "\n".join([_answer(2), "chatter", _answer(1)])
+    assert ai_provider.parse_batch_output(out, 2) == {
+        0: "story 1---purpose 1---artist 1",
+        1: "story 2---purpose 2---artist 2",
+    }
+
+
+def test_parse_batch_output_skips_missing_empty_and_out_of_range_items():
+    out = "\n".join([_answer(1), _answer(3, " "), _answer(4), _answer(0)])
+    assert ai_provider.parse_batch_output(out, 3) == {0: "story 1---purpose 1---artist 1"}
+
+
+def test_parse_batch_output_keeps_first_of_duplicate_items():
+    out = "\n".join([_answer(1, "first"), _answer(1, "second")])
+    assert ai_provider.parse_batch_output(out, 1) == {0: "first"}
+
+
+def test_parse_batch_output_ignores_mismatched_markers_and_no_output():
+    assert ai_provider.parse_batch_output("<<<ITEM 1>>>story<<<END 2>>>", 2) == {}
+    assert ai_provider.parse_batch_output(None, 2) == {}
+
+
+# ----------------------
+# generate_batch
+# ----------------------
+def test_generate_batch_splits_sections_per_item(gemini):
+    gemini.reply = "\n".join([_answer(1), _answer(2)])
+    results = ai_provider.generate_batch([("p1", "", []), ("p2", "", [])])
+    assert results == [("story 1", "purpose 1", "artist 1"), ("story 2", "purpose 2", "artist 2")]
+    assert len(gemini) == 1 and "<<<ITEM 2>>>" in gemini[0]
+
+
+def test_generate_batch_falls_back_locally_for_missing_items_only(gemini):
+    gemini.reply = _answer(2)
+    results = ai_provider.generate_batch([("p1", "a quiet harbour", ["blue"]), ("p2", "", []), ("p3", "", [])])
+    assert results[1] == ("story 2", "purpose 2", "artist 2")
+    assert results[0] == ai_provider._local_generate("a quiet harbour", ["blue"])
+    assert results[2] == ai_provider._local_generate("", [])
+
+
+def test_generate_batch_single_job_uses_plain_prompt(gemini):
+    gemini.reply = "story---purpose---artist"
+    assert ai_provider.generate_batch([("only prompt", "", [])]) == [("story", "purpose", "artist")]
+    assert gemini == ["only prompt"]
+
+
+def test_generate_batch_falls_back_when_gemini_fails(gemini):
+    gemini.reply = None
+    results = ai_provider.generate_batch([("p1", "idea", []), ("p2", "", ["red"])])
+    assert results == [ai_provider._local_generate("idea", []), ai_provider._local_generate("", ["red"])]
+
+
+def test_generate_batch_without_gemini_uses_local_generation(gemini, monkeypatch):
+    monkeypatch.setattr(ai_provider, "AI_PROVIDER", "local")
+    assert ai_provider.generate_batch([("p1", "idea", [])]) == [ai_provider._local_generate("idea", [])]
+    assert gemini == []
+
+
+def test_generate_batch_hedge_budget_scales_with_batch_size(monkeypatch):
+    def slow_call(prompt):
+        time.sleep(0.3)  # over the per-story budget, within the budget for three stories
+        return "\n".join(_answer(i) for i in range(1, prompt.count("<<<END") + 1))
+
+    monkeypatch.setattr(ai_provider, "AI_PROVIDER", "gemini")
+    monkeypatch.setattr(ai_provider, "AI_HEDGE_AFTER", 0.2)
+    monkeypatch.setattr(ai_provider, "call_gemini", slow_call)
+    results = ai_provider.generate_batch([("p1", "", []), ("p2", "", []), ("p3", "", [])])
+    assert results == [(f"story {i}", f"purpose {i}", f"artist {i}") for i in (1, 2, 3)]
+    # A single story still has to answer within AI_HEDGE_AFTER
+    assert ai_provider.generate_batch([("p1", "idea", [])]) == [ai_provider._local_generate("idea", [])]
+
+
+# ----------------------
+# StoryBatcher
+# ----------------------
+def test_batcher_keeps_several_batches_in_flight(gemini):
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def slow_reply(prompt):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.5)
+        with lock:
+            running -= 1
+        return "\n".join(_answer(i) for i in range(1, prompt.count("<<<END") + 1))
+
+    gemini.reply = slow_reply
+    batcher = ai_provider.StoryBatcher(batch_size=8, max_wait=0.05, concurrency=4)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(lambda i: batcher.submit(f"p{i}").result(timeout=10), range(32)))
+    elapsed = time.perf_counter() - started
+
+    assert all(story.startswith("story ") for story, _, _ in results)
+    assert peak > 1
+    assert elapsed < 1.5  # one round of four concurrent batches, not four rounds back to back
+
+
+# ----------------------
+# Streamed generation
+# ----------------------
+class _BrokenStreamModel:
+    """Fake Gemini model whose stream yields some chunks and then fails."""
+
+    def __init__(self, chunks, fail=True):
+        self.chunks = chunks
+        self.fail = fail
+
+    def generate_content(self, prompt, stream=False):
+        for text in self.chunks:
+            yield type("Chunk", (), {"text": text})()
+        if self.fail:
+            raise ConnectionError("stream reset")
+
+
+@pytest.fixture
+def stream_model(monkeypatch):
+    monkeypatch.setattr(ai_provider, "AI_PROVIDER", "gemini")
+    monkeypatch.setattr(ai_provider, "breakers", {"gemini": ai_provider.CircuitBreaker("gemini-test")})
+
+    def use(model):
+        monkeypatch.setattr(ai_provider, "_get_gemini_model", lambda: model)
+
+    return use
+
+
+@pytest.mark.parametrize("hedge_after", [0, 5])
+def test_generate_streamed_replaces_a_cut_off_story_with_the_fallback(stream_model, monkeypatch, hedge_after):
+    monkeypatch.setattr(ai_provider, "AI_HEDGE_AFTER", hedge_after)
+    stream_model(_BrokenStreamModel(["Once upon ", "a ti"]))
+    shown = []
+    result = ai_provider.generate_streamed([], "a lighthouse", shown.append)
+    fallback = ai_provider._local_generate("a lighthouse", [])
+    assert result == fallback
+    assert shown[:2] == ["Once upon", "Once upon a ti"]
+    assert shown[-1] == fallback[0]
+
+
+def test_generate_streamed_keeps_a_complete_stream(stream_model):
+    stream_model(_BrokenStreamModel(["Once upon a time", "---to share", "---a painter"], fail=False))
+    assert ai_provider.generate_streamed([], "idea") == ("Once upon a time", "to share", "a painter")
+
+
+def test_generate_streamed_falls_back_when_the_stream_fails_up_front(stream_model):
+    stream_model(_BrokenStreamModel([]))
+    shown = []
+    result = ai_provider.generate_streamed([], "idea", shown.append)
+    assert result == ai_provider._local_generate("idea", [])
+    assert shown == [result[0]]
+
+
+# ----------------------
+# CircuitBreaker
+# ----------------------
+def _breaker(cooldown=0.05):
+    return ai_provider.CircuitBreaker("test", window=4, min_calls=4, failure_rate=0.5, cooldown=cooldown)
+
+
+def _fail(breaker, times):
+    for _ in range(times):
+        breaker.record(breaker.allow(), False)
+
+
+def test_breaker_opens_on_failure_rate_and_fails_fast():
+    breaker = _breaker(cooldown=60)
+    breaker.record(breaker.allow(), True)
+    _fail(breaker, 2)
+    assert breaker.snapshot()["state"] == "closed"  # below min_calls
+    _fail(breaker, 1)
+    assert breaker.snapshot()["state"] == "open"
+    assert breaker.allow() is None
+
+
+def test_breaker_slow_successes_count_as_failures():
+    breaker = _breaker(cooldown=60)
+    for _ in range(4):
+        breaker.record(breaker.allow(), True, ai_provider.AI_BREAKER_SLOW_CALL + 1)
+    assert breaker.snapshot()["state"] == "open"
+
+
+def test_breaker_half_open_admits_one_trial_that_closes_it():
+    breaker = _breaker()
+    _fail(breaker, 4)
+    time.sleep(0.06)
+    trial = breaker.allow()
+    assert trial is not None and breaker.snapshot()["state"] == "half_open"
+    assert breaker.allow() is None  # only one trial at a time
+    breaker.record(trial, True)
+    assert breaker.snapshot()["state"] == "closed"
+    assert breaker.snapshot()["recent_calls"] == 0
+
+
+def test_breaker_failed_trial_reopens_for_another_cooldown():
+    breaker = _breaker()
+    _fail(breaker, 4)
+    time.sleep(0.06)
+    breaker.record(breaker.allow(), False)
+    assert breaker.snapshot()["state"] == "open"
+    assert breaker.allow() is None
+    time.sleep(0.06)
+    assert breaker.allow() is not None
+
+
+def test_breaker_ignores_calls_admitted_before_the_state_changed():
+    breaker = _breaker()
+    slow = breaker.allow()  # still running while the breaker opens
+    _fail(breaker, 4)
+    time.sleep(0.06)
+    trial = breaker.allow()
+    breaker.record(slow, True)
+    assert breaker.snapshot()["state"] == "half_open"
+    assert breaker.allow() is None  # the trial is still the one in flight
+    breaker.record(trial, False)
+    assert breaker.snapshot()["state"] == "open"
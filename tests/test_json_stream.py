@@ -0,0 +1,36 @@
+# Streamed JSON arrays (?stream=1) must survive being consumed chunk by chunk while other
+# requests keep the threadpool busy, so consecutive chunks are produced on different threads.
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("ARTFEED_DB", os.path.join(tempfile.mkdtemp(), "artfeed.db"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app  # noqa: E402
+
+POSTS = app.JSON_STREAM_BATCH * 3 + 7  # several fetchmany batches
+CONCURRENT = 8
+
+
+def _read_stream(client, url):
+    with client.stream("GET", url) as response:
+        assert response.status_code == 200
+        return app.json.loads("".join(response.iter_text()))
+
+
+def test_stream_endpoints_return_every_row():
+    with TestClient(app.app) as client:
+        rows = [
+            dict(image_path=None, title=f"t{i}", idea_text="", story="", purpose="", artist="streamer",
+                 price="", contact="", category="Art")
+            for i in range(POSTS)
+        ]
+        app.insert_posts(rows)
+        urls = ["/feed_api?stream=1", "/feed_api?stream=1&category=Art"] * (CONCURRENT // 2)
+        with ThreadPoolExecutor(max_workers=CONCURRENT) as pool:
+            results = list(pool.map(lambda url: _read_stream(client, url), urls))
+        for posts in results:
+            assert len(posts) == POSTS
+            assert len({p["id"] for p in posts}) == POSTS
@@ -0,0 +1,68 @@
+# /metrics merges every worker's snapshot when METRICS_MULTIPROC_DIR is set.
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import metrics
+
+
+def _value(text, series):
+    for line in text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+@pytest.fixture
+def multiproc_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _write_worker(directory, pid, data):
+    (directory / f"metrics-{pid}.json").write_text(json.dumps(data))
+
+
+def _exited_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def test_single_process_render_is_unchanged(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_MULTIPROC_DIR", "")
+    metrics.DB_QUERIES.inc(kind="PRAGMA")
+    assert _value(metrics.render(), 'db_queries_total{kind="PRAGMA"}') >= 1
+
+
+def test_counters_and_histograms_sum_across_live_and_exited_workers(multiproc_dir):
+    own = _value(metrics.render(), 'db_queries_total{kind="SELECT"}') or 0
+    buckets = len(metrics.DB_QUERY_DURATION.buckets)
+    for pid in (os.getppid(), _exited_pid()):
+        _write_worker(multiproc_dir, pid, {
+            "db_queries_total": [[["SELECT"], 5]],
+            "db_query_duration_seconds": [[["SELECT"], {"counts": [1] * buckets, "sum": 0.25, "count": 1}]],
+        })
+    text = metrics.render()
+    assert _value(text, 'db_queries_total{kind="SELECT"}') == own + 10
+    assert _value(text, 'db_query_duration_seconds_count{kind="SELECT"}') >= 2
+    assert (multiproc_dir / f"metrics-{os.getpid()}.json").exists()
+
+
+def test_gauges_only_count_live_workers(multiproc_dir):
+    series = 'http_requests_in_flight{method="GET",route="/gauge-test"}'
+    _write_worker(multiproc_dir, os.getppid(), {"http_requests_in_flight": [[["GET", "/gauge-test"], 2]]})
+    _write_worker(multiproc_dir, _exited_pid(), {"http_requests_in_flight": [[["GET", "/gauge-test"], 7]]})
+    metrics.HTTP_REQUESTS_IN_FLIGHT.inc(method="GET", route="/gauge-test")
+    try:
+        assert _value(metrics.render(), series) == 3
+    finally:
+        metrics.HTTP_REQUESTS_IN_FLIGHT.dec(method="GET", route="/gauge-test")
+
+
+def test_max_gauges_report_the_worst_worker(multiproc_dir):
+    _write_worker(multiproc_dir, os.getppid(), {"ai_provider_breaker_state": [[["gemini"], 2]]})
+    assert _value(metrics.render(), 'ai_provider_breaker_state{provider="gemini"}') == 2
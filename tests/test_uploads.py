@@ -0,0 +1,55 @@
+# Serving uploads: immutable caching, conditional requests and byte ranges.
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import uploads
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path))
+    app = FastAPI()
+
+    @app.get("/uploads/{rel_path:path}")
+    def serve(request: Request, rel_path: str):
+        return uploads.serve_upload(request, rel_path)
+
+    return TestClient(app)
+
+
+def test_content_addressed_upload_is_immutable_and_revalidates(client):
+    url = uploads.save_upload(CONTENT, "art.png")
+    response = client.get(url)
+    assert response.status_code == 200 and response.content == CONTENT
+    assert response.headers["cache-control"] == uploads.IMMUTABLE_CACHE
+    etag = response.headers["etag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_range_requests(client):
+    url = uploads.save_upload(CONTENT, "art.png")
+    etag = client.get(url).headers["etag"]
+
+    part = client.get(url, headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206 and part.content == CONTENT[10:20]
+    assert part.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+    assert part.headers["etag"] == etag
+
+    assert client.get(url, headers={"Range": "bytes=-5"}).content == CONTENT[-5:]
+    assert client.get(url, headers={"Range": f"bytes={len(CONTENT)}-"}).status_code == 416
+
+
+def test_if_range_uses_the_upload_etag(client):
+    url = uploads.save_upload(CONTENT, "art.png")
+    etag = client.get(url).headers["etag"]
+    assert client.get(url, headers={"Range": "bytes=0-9", "If-Range": etag}).status_code == 206
+    stale = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert stale.status_code == 200 and stale.content == CONTENT
+
+
+def test_paths_outside_the_upload_dir_are_not_served(client):
+    assert client.get("/uploads/../secret.txt").status_code == 404
+    assert client.get("/uploads/missing.png").status_code == 404
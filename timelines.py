@@ -0,0 +1,147 @@
+# timelines.py
+# Per-user "following" timelines, materialized on write.
+#
+# insert_post copies the new post id into every follower's timeline (fan-out on write).
+# Artists with more than FANOUT_MAX_FOLLOWERS followers are skipped on write; their
+# posts are merged in when the timeline is read (fan-out on read). When such an artist
+# drops back to the threshold, their recent posts are materialized for every follower.
+# Follower counts come from artist_stats.followers (kept up to date in the same transaction
+# as each follow/unfollow, which must update artist_stats before calling the hooks here),
+# so the fan-out decision is a primary-key lookup rather than a COUNT over follows.
+import os
+
+from db import get_conn
+
+FANOUT_MAX_FOLLOWERS = int(os.getenv("FANOUT_MAX_FOLLOWERS", "1000") or 1000)
+# How many of an artist's recent posts are copied into a timeline on follow, on rebuild and
+# when the artist drops back under the fan-out threshold
+TIMELINE_BACKFILL = int(os.getenv("TIMELINE_BACKFILL", "200") or 200)
+
+
+def ensure_tables(c):
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS timelines (
+            user TEXT NOT NULL,
+            post_id INTEGER NOT NULL,
+            PRIMARY KEY (user, post_id)
+        ) WITHOUT ROWID
+        """
+    )
+    # Follower counts per artist (fan-out decision) and follower lookups
+    c.execute("CREATE INDEX IF NOT EXISTS idx_follows_artist ON follows(artist)")
+
+
+def _follower_count(c, artist_key):
+    c.execute("SELECT followers FROM artist_stats WHERE artist=?", (artist_key,))
+    row = c.fetchone()
+    return row[0] if row else 0
+
+
+def is_fanout_on_read(c, artist_key) -> bool:
+    return _follower_count(c, artist_key) > FANOUT_MAX_FOLLOWERS
+
+
+# ----------------------
+# Incremental updates (run inside the caller's transaction)
+# ----------------------
+def on_new_post(c, post_id, artist):
+    artist_key = (artist or "").strip().lower()
+    if not artist_key or is_fanout_on_read(c, artist_key):
+        return
+    c.execute(
+        "INSERT OR IGNORE INTO timelines (user, post_id) SELECT follower, ? FROM follows WHERE artist=?",
+        (post_id, artist_key),
+    )
+
+
+def on_follow(c, follower_key, artist_key):
+    c.execute(
+        """
+        INSERT OR IGNORE INTO timelines (user, post_id)
+        SELECT ?, id FROM posts WHERE LOWER(TRIM(artist))=? ORDER BY id DESC LIMIT ?
+        """,
+        (follower_key, artist_key, TIMELINE_BACKFILL),
+    )
+
+
+def on_unfollow(c, follower_key, artist_key):
+    c.execute(
+        """
+        DELETE FROM timelines
+        WHERE user=? AND post_id IN (SELECT id FROM posts WHERE LOWER(TRIM(artist))=?)
+        """,
+        (follower_key, artist_key),
+    )
+    if _follower_count(c, artist_key) == FANOUT_MAX_FOLLOWERS:
+        # Back to fan-out on write: posts made while above the threshold were never copied
+        _materialize_artist(c, artist_key)
+
+
+def _materialize_artist(c, artist_key):
+    c.execute(
+        """
+        INSERT OR IGNORE INTO timelines (user, post_id)
+        SELECT f.follower, p.id
+        FROM follows f
+        JOIN (SELECT id FROM posts WHERE LOWER(TRIM(artist))=? ORDER BY id DESC LIMIT ?) p
+        WHERE f.artist=?
+        """,
+        (artist_key, TIMELINE_BACKFILL, artist_key),
+    )
+
+
+# ----------------------
+# Reads
+# ----------------------
+def fanout_on_read_artists(c, follower_key):
+    """Followed artists whose posts are not fanned out and must be merged at read time."""
+    c.execute(
+        """
+        SELECT f.artist FROM follows f
+        JOIN artist_stats s ON s.artist = f.artist
+        WHERE f.follower=? AND s.followers > ?
+        """,
+        (follower_key, FANOUT_MAX_FOLLOWERS),
+    )
+    return [r[0] for r in c.fetchall()]
+
+
+# ----------------------
+# Maintenance
+# ----------------------
+def rebuild():
+    """Recompute all timelines from follows and posts."""
+    conn = get_conn()
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        c.execute("DELETE FROM timelines")
+        c.execute(
+            """
+            INSERT OR IGNORE INTO timelines (user, post_id)
+            SELECT f.follower, p.id
+            FROM follows f
+            JOIN (
+                SELECT id, LOWER(TRIM(artist)) AS artist_key,
+                       ROW_NUMBER() OVER (PARTITION BY LOWER(TRIM(artist)) ORDER BY id DESC) AS recency
+                FROM posts
+            ) p ON p.artist_key = f.artist AND p.recency <= ?
+            WHERE (SELECT COUNT(*) FROM follows f2 WHERE f2.artist=f.artist) <= ?
+            """,
+            (TIMELINE_BACKFILL, FANOUT_MAX_FOLLOWERS),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def ensure_timelines():
+    """Populate timelines the first time they are deployed against existing follows."""
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("SELECT EXISTS(SELECT 1 FROM timelines), EXISTS(SELECT 1 FROM follows)")
+    has_timelines, has_follows = c.fetchone()
+    conn.close()
+    if has_follows and not has_timelines:
+        rebuild()
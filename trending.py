@@ -0,0 +1,160 @@
+# trending.py
+# Time-decayed engagement scores kept in a materialized table (post_scores).
+#
+# Every score is expressed relative to one shared reference time (score_meta.ref_time):
+# an event at time t adds 2 ** ((t - ref_time) / half_life). Ranking is therefore
+# always exact, and the periodic decay pass only rebases all scores to "now" so the
+# numbers stay small.
+import os
+import time
+import datetime
+import threading
+
+from db import get_conn
+
+TRENDING_HALF_LIFE = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24") or 24) * 3600
+TRENDING_DECAY_INTERVAL = float(os.getenv("TRENDING_DECAY_INTERVAL", "3600") or 3600)
+# A new post starts with the weight of this many likes so it can surface before it is liked
+NEW_POST_WEIGHT = 1.0
+
+
+def ensure_tables(c):
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS post_scores (
+            post_id INTEGER PRIMARY KEY,
+            score REAL NOT NULL DEFAULT 0
+        )
+        """
+    )
+    c.execute("CREATE INDEX IF NOT EXISTS idx_post_scores_score ON post_scores(score DESC)")
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS score_meta (
+            key TEXT PRIMARY KEY,
+            value REAL
+        )
+        """
+    )
+
+
+def _to_epoch(value) -> float:
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime.datetime):
+        dt = value
+    else:
+        try:
+            dt = datetime.datetime.fromisoformat(str(value))
+        except ValueError:
+            return time.time()
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)  # timestamps are stored in UTC
+    return dt.timestamp()
+
+
+def _ref_time(c) -> float:
+    c.execute("SELECT value FROM score_meta WHERE key='ref_time'")
+    row = c.fetchone()
+    if row:
+        return row[0]
+    now = time.time()
+    c.execute("INSERT OR REPLACE INTO score_meta (key, value) VALUES ('ref_time', ?)", (now,))
+    return now
+
+
+def _weight(c, at) -> float:
+    return 2 ** ((_to_epoch(at) - _ref_time(c)) / TRENDING_HALF_LIFE)
+
+
+# ----------------------
+# Incremental updates (run inside the caller's transaction)
+# ----------------------
+def on_new_post(c, post_id, created_at=None):
+    c.execute(
+        "INSERT OR REPLACE INTO post_scores (post_id, score) VALUES (?, ?)",
+        (post_id, NEW_POST_WEIGHT * _weight(c, created_at)),
+    )
+
+
+def on_like(c, post_id, liked_at=None):
+    c.execute(
+        "INSERT INTO post_scores (post_id, score) VALUES (?, ?) "
+        "ON CONFLICT(post_id) DO UPDATE SET score = score + excluded.score",
+        (post_id, _weight(c, liked_at)),
+    )
+
+
+def on_unlike(c, post_id, liked_at):
+    c.execute(
+        "UPDATE post_scores SET score = MAX(score - ?, 0) WHERE post_id=?",
+        (_weight(c, liked_at), post_id),
+    )
+
+
+# ----------------------
+# Maintenance
+# ----------------------
+def decay():
+    """Rebase every score to the current time (scales all rows by the same factor)."""
+    conn = get_conn()
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        factor = 2 ** ((_ref_time(c) - now) / TRENDING_HALF_LIFE)
+        c.execute("UPDATE post_scores SET score = score * ?", (factor,))
+        c.execute("INSERT OR REPLACE INTO score_meta (key, value) VALUES ('ref_time', ?)", (now,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def rebuild():
+    """Recompute all scores from posts and likes."""
+    conn = get_conn()
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        c.execute("INSERT OR REPLACE INTO score_meta (key, value) VALUES ('ref_time', ?)", (now,))
+        scores = {}
+        c.execute("SELECT id, created_at FROM posts")
+        for post_id, created_at in c.fetchall():
+            scores[post_id] = NEW_POST_WEIGHT * 2 ** ((_to_epoch(created_at) - now) / TRENDING_HALF_LIFE)
+        c.execute("SELECT post_id, created_at FROM likes")
+        for post_id, liked_at in c.fetchall():
+            if post_id in scores:
+                scores[post_id] += 2 ** ((_to_epoch(liked_at) - now) / TRENDING_HALF_LIFE)
+        c.execute("DELETE FROM post_scores")
+        c.executemany("INSERT INTO post_scores (post_id, score) VALUES (?, ?)", scores.items())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def ensure_scores():
+    """Populate post_scores the first time it is deployed against existing posts."""
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("SELECT EXISTS(SELECT 1 FROM post_scores), EXISTS(SELECT 1 FROM posts)")
+    has_scores, has_posts = c.fetchone()
+    conn.close()
+    if has_posts and not has_scores:
+        rebuild()
+
+
+def start_decay_thread(interval: float = TRENDING_DECAY_INTERVAL):
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                decay()
+            except Exception as e:
+                print("Trending decay failed:", e)
+
+    thread = threading.Thread(target=run, name="trending-decay", daemon=True)
+    thread.start()
+    return thread
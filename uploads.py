@@ -0,0 +1,129 @@
+# uploads.py
+# Content-addressed storage and cache-friendly serving for uploaded images.
+#
+# New uploads are stored as static/uploads/<h[0:2]>/<h[2:4]>/<sha256>.<ext> and served from
+# /uploads/... . Since the name is derived from the bytes, those URLs never change content and
+# are served with a strong ETag and "Cache-Control: immutable". Older uuid-named files keep
+# working with a short revalidating cache policy; their /static/uploads/... URLs are routed
+# here too (ahead of the /static mount) rather than to StaticFiles.
+import os
+import re
+import hashlib
+import tempfile
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "static", "uploads")
+UPLOAD_URL_PREFIX = "/uploads/"
+LEGACY_URL_PREFIX = "/static/uploads/"
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+LEGACY_CACHE = "public, max-age=3600, must-revalidate"
+
+_CONTENT_NAME_RE = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{1,8}$")
+
+
+# ----------------------
+# Storage
+# ----------------------
+def _clean_ext(filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not re.fullmatch(r"\.[a-z0-9]{1,8}", ext):
+        ext = ".jpg"
+    return ext
+
+
+def save_upload(content: bytes, filename: str) -> str:
+    """Store bytes under their SHA-256 name and return the public URL. Identical files are stored once."""
+    digest = hashlib.sha256(content).hexdigest()
+    rel = f"{digest[:2]}/{digest[2:4]}/{digest}{_clean_ext(filename)}"
+    dest = os.path.join(UPLOAD_DIR, *rel.split("/"))
+    if not os.path.exists(dest):
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        # Unique temp file per call: threads saving the same bytes must not share one
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, dest)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if not os.path.exists(dest):  # someone else finishing the same file first is fine
+                raise
+    return UPLOAD_URL_PREFIX + rel
+
+
+def url_to_path(url: str | None) -> str | None:
+    """Map an image URL stored on a post back to its file on disk."""
+    if not url:
+        return None
+    for prefix in (UPLOAD_URL_PREFIX, LEGACY_URL_PREFIX):
+        if url.startswith(prefix):
+            return _resolve(url[len(prefix):])
+    return None
+
+
+def _resolve(rel_path: str) -> str | None:
+    root = os.path.realpath(UPLOAD_DIR)
+    path = os.path.realpath(os.path.join(root, rel_path))
+    if not path.startswith(root + os.sep):
+        return None
+    return path
+
+
+# ----------------------
+# Serving
+# ----------------------
+def _etag(path: str, st) -> str:
+    name = os.path.basename(path)
+    if _CONTENT_NAME_RE.match(name):
+        return f'"{name.split(".", 1)[0]}"'
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def _not_modified(request: Request, etag: str, st) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(st.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class _UploadFileResponse(FileResponse):
+    """FileResponse whose If-Range check uses the ETag / Last-Modified this module sends
+    (Starlette only recognises its own generated ETag there)."""
+
+    def _should_use_range(self, http_if_range, stat_result) -> bool:
+        return http_if_range.strip() in (self.headers.get("etag"), self.headers.get("last-modified"))
+
+
+def serve_upload(request: Request, rel_path: str) -> Response:
+    path = _resolve(rel_path)
+    if not path or not os.path.isfile(path):
+        return Response("Not found", status_code=404)
+    st = os.stat(path)
+    etag = _etag(path, st)
+    immutable = _CONTENT_NAME_RE.match(os.path.basename(path)) is not None
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": IMMUTABLE_CACHE if immutable else LEGACY_CACHE,
+        "Accept-Ranges": "bytes",
+    }
+    if _not_modified(request, etag, st):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    # FileResponse answers Range requests itself (single and multipart ranges) and reads the
+    # file in chunks; the headers above (ETag included) carry over to 206 responses
+    return _UploadFileResponse(path, media_type=media_type, headers=headers, stat_result=st)